@@ -1,27 +1,33 @@
 import asyncio
-import json
-import re
+import os
+import signal
+import sys
+from functools import partial
 from aiogram import Bot, Dispatcher, F, types
-from aiogram.filters.command import Command
+from aiogram.filters.command import Command, CommandObject
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from auth_data import bot_token
+from catalog import Catalog
+from prices import normalize_product
+from render import build_messages, escape_markdown, fitting_fragments, render_drop
+from store import DB_PATH, ProductStore
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tg_common.fake_telegram import run_benchmark
+from tg_common.sender import SendScheduler
+from tg_common.webhook import build_webhook_app, parse_args, run_webhook, worker_send_rate
 
 bot = Bot(token=bot_token)
 dispatcher = Dispatcher()
+# All outgoing messages go through one rate-limited queue
+sender = SendScheduler(bot)
 
 
-# Load products from JSON file
-def load_products():
-    with open('prices.json', 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    return data['products']
-
-
-# Save products to JSON file
-def save_products(products):
-    with open('prices.json', 'w', encoding='utf-8') as file:
-        json.dump(products, file, indent=4)
+# Products live in SQLite; the catalog keeps an indexed in-memory copy for reads
+store = ProductStore(DB_PATH)
+catalog = Catalog(store)
 
 
 # Generate the command list message
@@ -30,6 +36,7 @@ def get_command_list():
         "/start - Start a conversation\n"
         "/location - Show all locations\n"
         "/lowprices - Find the 3 lowest prices\n"
+        "/drops - Biggest price drops since the last crawl, e.g. /drops Київ\n"
         "/delete - Delete product by ID\n"
         "/keyword - Find products by keyword\n"
         "/products_by_location - Find products by location"
@@ -43,20 +50,20 @@ async def handle_message(message: types.Message):
         "Welcome! Click a command below to interact with the bot:\n\n"
         f"{get_command_list()}"
     )
-    await message.answer(welcome_message)
+    sender.answer(message, welcome_message)
 
 
 # Command to add a new product
 @dispatcher.message(Command("add"))
 async def add_product_command(message: types.Message):
-    await message.answer("Please send the product details in the format: title,price")
-    await message.answer(get_command_list())
+    sender.answer(message, "Please send the product details in the format: title,price")
+    sender.answer(message, get_command_list())
 
 
 # Command to list all commands
 @dispatcher.message(Command("commands"))
 async def list_commands(message: types.Message):
-    await message.answer(f"Available commands:\n{get_command_list()}")
+    sender.answer(message, f"Available commands:\n{get_command_list()}")
 
 
 # Handler to process the product input
@@ -65,155 +72,223 @@ async def add_product_handler(message: types.Message):
     title, price = message.text.split(',')
     price = float(price)
 
-    # Load the existing products
-    products = load_products()
-
-    # Add the new product
-    products.append({
-        'id': len(products) + 1,
+    # A single INSERT; the database assigns the id
+    await catalog.add(normalize_product({
         'title': title,
         'price': price
-    })
+    }))
 
-    # Save the updated products
-    save_products(products)
-
-    await message.answer(f'Product added: {title} with price {price}')
-    await message.answer(get_command_list())
+    sender.answer(message, f'Product added: {title} with price {price}')
+    sender.answer(message, get_command_list())
 
 
 # Command to list all products
 @dispatcher.message(Command("list"))
 async def list_products(message: types.Message):
-    products = load_products()
-    if products:
-        response = "\n".join(
-            [f"{product['id']}. {product['title']} (Price: {product['price']})" for product in products]
-        )
-    else:
+    products = await catalog.products()
+    response = "\n".join(
+        f"{product['id']}. {product['title']} (Price: {product['price']})" for product in products
+    )
+    if not response:
         response = "No products found."
-    await message.answer(response)
-    await message.answer(get_command_list())
+    sender.answer(message, response)
+    sender.answer(message, get_command_list())
 
 
-def escape_markdown(text):
-    return re.sub(r'([!#\$%&\'\(\)\*\+,\-\.\/:;<=>\?@\[\\\]\^_`\{\|\}~])', r'\\\1', text)
+# Command to find the 3 lowest prices
+@dispatcher.message(Command("lowprices"))
+async def low_prices(message: types.Message):
+    # Read the 3 cheapest in hryvnias off the catalog's price index; products without a number ("Обмін") are not in it
+    lowest_prices = await catalog.lowest(3)
+    if not lowest_prices:
+        sender.answer(message, "No products found.")
+        sender.answer(message, get_command_list())
+        return
 
+    # Each product's block is rendered once and reused until the product changes
+    for msg in build_messages("3 Lowest Prices:\n", catalog.render(lowest_prices)):
+        sender.answer(message, msg, parse_mode=ParseMode.MARKDOWN_V2)
+    sender.answer(message, get_command_list())
 
-# Split long messages into smaller parts
-def split_message(text, max_length=4096):
-    chunks = []
-    while len(text) > max_length:
-        split_pos = text[:max_length].rfind('\n')
-        if split_pos == -1:
-            split_pos = max_length
-        chunks.append(text[:split_pos])
-        text = text[split_pos:].strip()
-    chunks.append(text)
-    return chunks
 
+DROPS_LIMIT = 10
 
-# Command to find the 3 lowest prices
-@dispatcher.message(Command("lowprices"))
-async def low_prices(message: types.Message):
-    products = load_products()
-    if not products:
-        await message.answer("No products found.")
-        await message.answer(get_command_list())
+
+# Command to show the biggest price drops of the latest crawl, optionally in one location
+@dispatcher.message(Command("drops"))
+async def price_drops(message: types.Message, command: CommandObject):
+    location = command.args.strip() if command.args else None
+    messages = await catalog.cached_response(('drops', location))
+    if messages is None:
+        drops = await store.price_drops(location, limit=DROPS_LIMIT)
+        if drops:
+            header = "Price drops since the last crawl" + (f" in {location}" if location else "") + ":\n"
+            messages = build_messages(escape_markdown(header), [render_drop(drop) for drop in drops])
+        else:
+            messages = [escape_markdown("No price drops found.")]
+        catalog.cache_response(('drops', location), messages)
+
+    for msg in messages:
+        sender.answer(message, msg, parse_mode=ParseMode.MARKDOWN_V2)
+    sender.answer(message, get_command_list())
+
+
+# Command to find products by keywords in the title, e.g. "/keyword iphone 13"
+@dispatcher.message(Command("keyword"))
+async def keyword_search(message: types.Message, command: CommandObject):
+    if not command.args:
+        sender.answer(message, "Please send the keywords after the command, e.g. /keyword iphone 13")
+        sender.answer(message, get_command_list())
         return
 
-    # Sort products by price (assuming price is in format like "21 200 грн.")
-    sorted_products = sorted(products, key=lambda x: float(re.sub(r"[^\d.]", "", x["price"])))
-    lowest_prices = sorted_products[:3]
-
-    response = "3 Lowest Prices:\n"
-    for product in lowest_prices:
-        response += (
-            f"Title: [{escape_markdown(product['title'])}]({escape_markdown(product['link'])})\n"
-            f"Price: {escape_markdown(product['price'])}\n"
-            f"Location: {escape_markdown(product['location'])}\n"
-            f"Date of publication: {escape_markdown(product['date of publication'])}\n\n"
+    products = await catalog.search(command.args, limit=20)
+    if products:
+        response = "\n".join(
+            f"{product['id']}. {product['title']} (Price: {product['price']})" for product in products
         )
-
-    await message.answer(response, parse_mode=ParseMode.MARKDOWN_V2)
-    await message.answer(get_command_list())
+    else:
+        response = f"No products found for: {command.args}"
+    sender.answer(message, response)
+    sender.answer(message, get_command_list())
 
 
 # Command to delete a product by its ID
 @dispatcher.message(Command("delete"))
 async def delete_product_command(message: types.Message):
-    await message.answer("Please send the ID of the product to delete")
-    await message.answer(get_command_list())
+    sender.answer(message, "Please send the ID of the product to delete")
+    sender.answer(message, get_command_list())
 
 
 @dispatcher.message(F.text.regexp(r'^\d+$'))
 async def delete_product_handler(message: types.Message):
     product_id = int(message.text)
 
-    # Load existing products
-    products = load_products()
-
-    # Filter out the product with the given ID
-    new_products = [product for product in products if product['id'] != product_id]
+    removed = await catalog.delete(product_id)
 
-    if len(new_products) == len(products):
-        await message.answer(f'No product with ID {product_id} found.')
+    if not removed:
+        sender.answer(message, f'No product with ID {product_id} found.')
     else:
-        # Save the updated list of products
-        save_products(new_products)
-        await message.answer(f'Product with ID {product_id} deleted.')
+        sender.answer(message, f'Product with ID {product_id} deleted.')
 
-    await message.answer(get_command_list())
+    sender.answer(message, get_command_list())
 
 
 # Command to show all locations
 @dispatcher.message(Command("location"))
 async def show_locations(message: types.Message):
-    products = load_products()
-    locations = sorted(set(product["location"] for product in products))
+    locations = await catalog.locations()
     response = "Locations:\n" + "\n".join(locations)
-    await message.answer(response)
-    await message.answer(get_command_list())
+    sender.answer(message, response)
+    sender.answer(message, get_command_list())
+
+
+LOCATION_PAGE_SIZE = 10
+
+
+def locations_keyboard(locations):
+    # Create an inline keyboard with a button for each location
+    buttons = [
+        InlineKeyboardButton(text=location, callback_data=f"loc:{catalog.location_id(location)}:0")
+        for location in locations
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[[button] for button in buttons])
+
+
+# One page of a location with prev/next buttons; the callback data carries the offset
+async def render_location_page(location_id, offset):
+    location = await catalog.location_name(location_id)
+    if location is None:
+        return escape_markdown("This location list is outdated, please run /products_by_location again."), None
+
+    cached = await catalog.cached_response(('location', location_id, offset))
+    if cached is not None:
+        return cached
+
+    products, total = await catalog.location_page(location, offset, LOCATION_PAGE_SIZE)
+    shown = len(products)
+    if not products:
+        text = escape_markdown(f"No products found in {location}.")
+    else:
+        def page_header(count):
+            return (f"Products in {escape_markdown(location)} "
+                    f"\\({offset + 1}\\-{offset + count} of {total}\\):\n")
+
+        # A page is one message: show fewer products when their text would not fit, and let
+        # the Next button continue right after the last one shown
+        fragments = catalog.render(products, with_location=False)
+        shown = fitting_fragments(len(page_header(len(products))), fragments)
+        text = build_messages(page_header(shown), fragments[:shown])[0]
+
+    navigation = []
+    if offset > 0:
+        previous_offset = max(0, offset - LOCATION_PAGE_SIZE)
+        navigation.append(InlineKeyboardButton(text="« Prev", callback_data=f"loc:{location_id}:{previous_offset}"))
+    if offset + shown < total:
+        next_offset = offset + shown
+        navigation.append(InlineKeyboardButton(text="Next »", callback_data=f"loc:{location_id}:{next_offset}"))
+    rows = [navigation] if navigation else []
+    rows.append([InlineKeyboardButton(text="All locations", callback_data="locs")])
+    keyboard = InlineKeyboardMarkup(inline_keyboard=rows)
+
+    catalog.cache_response(('location', location_id, offset), (text, keyboard))
+    return text, keyboard
+
+
+async def edit_message(message, text, **kwargs):
+    try:
+        await message.edit_text(text, **kwargs)
+    except TelegramBadRequest as e:
+        # Pressing the same button twice asks for an identical edit
+        if "message is not modified" not in str(e):
+            raise
 
 
 # Command to find products by location
 @dispatcher.message(Command("products_by_location"))
 async def products_by_location(message: types.Message):
-    products = load_products()
-    locations = set(product["location"] for product in products)
+    keyboard = locations_keyboard(await catalog.locations())
+    sender.answer(message, "Select a location:", reply_markup=keyboard)
 
-    # Create an inline keyboard with a button for each location
-    buttons = [InlineKeyboardButton(text=location, callback_data=f"location_{location}") for location in locations]
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[button] for button in buttons])
 
-    await message.answer("Select a location:", reply_markup=keyboard)
-    await message.answer(get_command_list())
+# Back from a location page to the list of locations
+@dispatcher.callback_query(F.data == "locs")
+async def show_location_list(callback_query: types.CallbackQuery):
+    keyboard = locations_keyboard(await catalog.locations())
+    await edit_message(callback_query.message, "Select a location:", reply_markup=keyboard)
+    await callback_query.answer()
 
 
-# Handler for the location callback
-@dispatcher.callback_query(lambda c: c.data and c.data.startswith('location_'))
+# Handler for the location buttons: every press edits the same message into the requested page
+@dispatcher.callback_query(F.data.regexp(r'^loc:[0-9a-f]+:\d+$'))
 async def show_products_by_location(callback_query: types.CallbackQuery):
-    location = callback_query.data.split("_")[1]
-    products = load_products()
-
-    response = f"Products in {escape_markdown(location)}:\n"
-    for product in products:
-        if product["location"] == location:
-            response += (
-                f"Title: [{escape_markdown(product['title'])}]({escape_markdown(product['link'])})\n"
-                f"Price: {escape_markdown(product['price'])}\n"
-                f"Date of publication: {escape_markdown(product['date of publication'])}\n\n"
-            )
-
-    if response == f"Products in {escape_markdown(location)}:\n":
-        response = f"No products found in {escape_markdown(location)}."
-
-    # Split the response into smaller parts and send each part separately
-    messages = split_message(response)
-    for msg in messages:
-        await callback_query.message.answer(msg, parse_mode=ParseMode.MARKDOWN_V2)
+    _, location_id, offset = callback_query.data.split(":")
+    text, keyboard = await render_location_page(location_id, int(offset))
+    await edit_message(callback_query.message, text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=keyboard)
+    await callback_query.answer()
+
+
+async def on_startup():
+    # The crawler (or an operator) can send SIGHUP to make the bot reload the catalog
+    if hasattr(signal, 'SIGHUP'):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, catalog.invalidate)
+    await store.open()
+    sender.start()
 
-    await callback_query.message.answer(get_command_list())
+
+async def on_shutdown():
+    await sender.stop()
+    await store.close()
+
+
+dispatcher.startup.register(on_startup)
+dispatcher.shutdown.register(on_shutdown)
+
+
+def make_webhook_app(secret_token=None, send_rate=None):
+    # With several worker processes each one gets a share of the global send limit
+    if send_rate is not None:
+        sender.set_global_rate(send_rate)
+    return build_webhook_app(dispatcher, bot, secret_token, health=sender.stats)
 
 
 async def main():
@@ -221,4 +296,12 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    args = parse_args("Best price bot")
+    if args.mode == 'webhook':
+        run_webhook(partial(make_webhook_app, args.secret, worker_send_rate(args.workers)), bot, args)
+    elif args.mode == 'benchmark':
+        if args.send_rate:
+            sender.set_global_rate(args.send_rate)
+        asyncio.run(run_benchmark(make_webhook_app, bot, args.updates, args.concurrency))
+    else:
+        asyncio.run(main())
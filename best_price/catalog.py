@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import re
+import time
+from itertools import islice
+from bisect import bisect_left, bisect_right, insort
+from render import render_product
+
+TOKEN_RE = re.compile(r'\w+')
+# Prices are only compared within one currency; listings without one are in hryvnias, like parse_price
+DEFAULT_CURRENCY = 'UAH'
+
+
+def tokenize(text):
+    return set(TOKEN_RE.findall(str(text).lower()))
+
+
+# Short id derived from the location name, so callback data stays within Telegram's 64 bytes
+# and a button keeps working after a restart or when another bot process answers it
+def location_key(location):
+    return hashlib.sha1(location.encode('utf-8')).hexdigest()[:10]
+
+
+# Products added through the bot have not been through the crawler's dedup stage
+def cluster_of(product):
+    return product.get('cluster_id') or product['id']
+
+
+def currency_of(product):
+    return product.get('currency') or DEFAULT_CURRENCY
+
+
+# Secondary indexes over the products, updated on every add/delete:
+#   location -> products, cluster -> products, title token -> ids, and a (currency, price, id)
+#   list sorted by currency and price holding only the cheapest product of each cluster in
+#   each currency, so a listing sold by several sellers takes one place in top-k queries and
+#   "$ 300" is never ranked against "2 000 грн".
+class CatalogIndex:
+    def __init__(self):
+        self.products = {}
+        self.by_location = {}
+        self.by_cluster = {}
+        self.by_price = []
+        self.cluster_price = {}
+        self.by_token = {}
+        # MarkdownV2 blocks rendered on first use: (id, with_location) -> text
+        self.fragments = {}
+
+    def fragment(self, product, with_location=True):
+        key = (product['id'], with_location)
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            fragment = self.fragments[key] = render_product(product, with_location)
+        return fragment
+
+    def add(self, product, sort_price=True):
+        if product['id'] in self.products:
+            self.remove(product['id'])
+        self.products[product['id']] = product
+
+        location = product.get('location')
+        if location is not None:
+            self.by_location.setdefault(location, {})[product['id']] = product
+
+        cluster = cluster_of(product)
+        self.by_cluster.setdefault(cluster, {})[product['id']] = product
+        if sort_price:
+            self._reprice(cluster)
+
+        for token in tokenize(product.get('title', '')):
+            self.by_token.setdefault(token, set()).add(product['id'])
+
+    def remove(self, product_id):
+        product = self.products.pop(product_id, None)
+        if product is None:
+            return
+        self.fragments.pop((product_id, True), None)
+        self.fragments.pop((product_id, False), None)
+
+        location = product.get('location')
+        if location in self.by_location:
+            products = self.by_location[location]
+            products.pop(product_id, None)
+            if not products:
+                del self.by_location[location]
+
+        cluster = cluster_of(product)
+        members = self.by_cluster.get(cluster)
+        if members is not None:
+            members.pop(product_id, None)
+            if not members:
+                del self.by_cluster[cluster]
+        self._reprice(cluster)
+
+        for token in tokenize(product.get('title', '')):
+            ids = self.by_token.get(token)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self.by_token[token]
+
+    # (currency, price, id) of the cluster's cheapest product in each currency it is listed in
+    @staticmethod
+    def cheapest(members):
+        entries = {}
+        for product in members.values():
+            if product.get('price_value') is None:
+                continue
+            entry = (currency_of(product), product['price_value'], product['id'])
+            if entry < entries.get(entry[0], (entry[0], float('inf'))):
+                entries[entry[0]] = entry
+        return sorted(entries.values())
+
+    # Point the price index at the cluster's cheapest products after its members changed
+    def _reprice(self, cluster):
+        for entry in self.cluster_price.pop(cluster, ()):
+            position = bisect_left(self.by_price, entry)
+            if position < len(self.by_price) and self.by_price[position] == entry:
+                del self.by_price[position]
+        entries = self.cheapest(self.by_cluster.get(cluster, {}))
+        if entries:
+            self.cluster_price[cluster] = entries
+            for entry in entries:
+                insort(self.by_price, entry)
+
+
+def build_index(products):
+    index = CatalogIndex()
+    for product in products:
+        index.add(product, sort_price=False)
+    for cluster, members in index.by_cluster.items():
+        entries = index.cheapest(members)
+        if entries:
+            index.cluster_price[cluster] = entries
+            index.by_price.extend(entries)
+    index.by_price.sort()
+    return index
+
+
+# Products kept in memory for the bot on top of the SQLite store. The table is read once
+# and read again only when another connection (the crawler) has committed, which the
+# store's data_version tells us (checked at most every check_interval seconds), or after
+# invalidate(), e.g. on SIGHUP. Reads are served from memory; a reload builds the new
+# indexes in a worker thread and swaps them in, so the event loop never stalls on it.
+class Catalog:
+    def __init__(self, store, check_interval=1.0):
+        self.store = store
+        self.check_interval = check_interval
+        self.version = 0
+        self._index = CatalogIndex()
+        self._data_version = None
+        self._checked_at = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+        # Changes made while a reload is reading the table, replayed onto the new indexes
+        self._loading = False
+        self._replay = []
+        # Finished responses keyed by e.g. location, valid for one catalog version
+        self._responses = {}
+        # location_key -> location name, rebuilt from the index when a key is not found
+        self._location_names = {}
+
+    def invalidate(self):
+        self._stale = True
+
+    async def refresh(self):
+        now = time.monotonic()
+        if not self._stale and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        async with self._lock:
+            data_version = await self.store.data_version()
+            if self._stale or data_version != self._data_version:
+                await self.load(data_version)
+
+    async def load(self, data_version=None):
+        self._loading = True
+        try:
+            products = await self.store.all_products()
+            index = await asyncio.get_running_loop().run_in_executor(None, build_index, products)
+            for apply_change in self._replay:
+                apply_change(index)
+            self._index = index
+        finally:
+            self._loading = False
+            self._replay = []
+        self._data_version = data_version if data_version is not None else await self.store.data_version()
+        self._stale = False
+        self.version += 1
+        print(f"Catalog loaded {len(self._index.products)} products (version {self.version}).")
+
+    async def products(self):
+        await self.refresh()
+        return list(self._index.products.values())
+
+    async def get(self, product_id):
+        await self.refresh()
+        return self._index.products.get(product_id)
+
+    async def locations(self):
+        await self.refresh()
+        return sorted(self._index.by_location)
+
+    async def by_location(self, location):
+        await self.refresh()
+        return list(self._index.by_location.get(location, {}).values())
+
+    # One page of a location without copying the whole location, plus the location's size
+    async def location_page(self, location, offset, limit):
+        await self.refresh()
+        products = self._index.by_location.get(location, {})
+        return list(islice(products.values(), offset, offset + limit)), len(products)
+
+    def location_id(self, location):
+        return location_key(location)
+
+    # Location a key stands for, or None if no current location has that key
+    async def location_name(self, location_id):
+        await self.refresh()
+        by_location = self._index.by_location
+        location = self._location_names.get(location_id)
+        if location is None or location not in by_location:
+            self._location_names = {location_key(location): location for location in by_location}
+            location = self._location_names.get(location_id)
+        return location
+
+    # The k cheapest listings in a currency, one per cluster, read straight off the sorted price index
+    async def lowest(self, k, currency=DEFAULT_CURRENCY):
+        await self.refresh()
+        index = self._index
+        start = bisect_left(index.by_price, (currency,))
+        end = bisect_left(index.by_price, (currency, float('inf')))
+        return [index.products[product_id] for _, _, product_id in index.by_price[start:min(end, start + k)]]
+
+    async def price_range(self, low, high, currency=DEFAULT_CURRENCY):
+        await self.refresh()
+        index = self._index
+        start = bisect_left(index.by_price, (currency, low, float('-inf')))
+        end = bisect_right(index.by_price, (currency, high, float('inf')))
+        return [index.products[product_id] for _, _, product_id in index.by_price[start:end]]
+
+    # Products whose titles contain every word of the query, cheapest first and one per cluster
+    async def search(self, query, limit=20):
+        await self.refresh()
+        index = self._index
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        id_sets = sorted((index.by_token.get(token, set()) for token in tokens), key=len)
+        ids = id_sets[0].intersection(*id_sets[1:])
+        products = [index.products[product_id] for product_id in ids]
+        products.sort(key=lambda product: (product.get('price_value') is None, product.get('price_value') or 0))
+        results = []
+        seen = set()
+        for product in products:
+            cluster = cluster_of(product)
+            if cluster not in seen:
+                seen.add(cluster)
+                results.append(product)
+                if len(results) == limit:
+                    break
+        return results
+
+    def render(self, products, with_location=True):
+        index = self._index
+        return [index.fragment(product, with_location) for product in products]
+
+    async def cached_response(self, key):
+        await self.refresh()
+        cached = self._responses.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        return None
+
+    def cache_response(self, key, response):
+        if len(self._responses) > 1000:
+            self._responses = {k: v for k, v in self._responses.items() if v[0] == self.version}
+        self._responses[key] = (self.version, response)
+
+    def _apply(self, apply_change):
+        apply_change(self._index)
+        if self._loading:
+            self._replay.append(apply_change)
+        self.version += 1
+
+    # Writes are single-row statements in the store, mirrored into memory; they are not
+    # serialized here, so concurrent writes reach the store's writer together and share a commit.
+    # Our own commits do not change data_version, so they never trigger a reload.
+    async def add(self, product):
+        await self.refresh()
+        product['id'] = await self.store.add(product)
+        self._apply(lambda index: index.add(product))
+        return product
+
+    async def delete(self, product_id):
+        await self.refresh()
+        if not await self.store.delete(product_id):
+            return False
+        self._apply(lambda index: index.remove(product_id))
+        return True
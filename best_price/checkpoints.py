@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+CHECKPOINT_DIR = 'crawl_state'
+
+
+def seller_key(seller_link):
+    return hashlib.sha1(seller_link.encode('utf-8')).hexdigest()[:16]
+
+
+# Fingerprint of a listing page: the (link, price text) of every card it shows, so a page is
+# only reused from the checkpoint when neither its listings nor their prices changed
+def page_fingerprint(cards):
+    return hashlib.sha1('\n'.join(sorted(f"{link}\t{price}" for link, price in cards)).encode('utf-8')).hexdigest()
+
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# Resumable crawl state: one checkpoint file per seller with the fingerprint and products
+# of every page, plus a run counter. A seller finished in the current run is skipped on
+# resume, and a page whose fingerprint did not change keeps its products from the last run.
+class CrawlState:
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+        self.run_path = os.path.join(directory, 'run.json')
+        self.run = 0
+        # When the run was first started; unlike the counter it stays unique if the directory is cleared
+        self.started = None
+        self.sellers_skipped = 0
+        self.pages_unchanged = 0
+        self.pages_scraped = 0
+        # Sellers complete in this run, whether crawled now or before a resume
+        self.sellers_finished = set()
+        self._lock = threading.Lock()
+
+    def start_run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        run = {'run': 0, 'complete': True}
+        if os.path.exists(self.run_path):
+            with open(self.run_path, 'r', encoding='utf-8') as f:
+                run = json.load(f)
+
+        if run['complete']:
+            self.run = run['run'] + 1
+            self.started = time.time()
+            write_json_atomic(self.run_path, {'run': self.run, 'complete': False, 'started': self.started})
+            print(f"Starting crawl run {self.run}.")
+        else:
+            self.run = run['run']
+            # Run files from before 'started' was kept: the resumed run gets a new one
+            self.started = run.get('started') or time.time()
+            write_json_atomic(self.run_path, {'run': self.run, 'complete': False, 'started': self.started})
+            print(f"Resuming interrupted crawl run {self.run}.")
+
+    def finish_run(self):
+        write_json_atomic(self.run_path, {'run': self.run, 'complete': True, 'started': self.started})
+        print(f"Crawl run {self.run}: {self.sellers_skipped} sellers resumed from checkpoints, "
+              f"{self.pages_unchanged} pages unchanged, {self.pages_scraped} pages scraped.")
+
+    def _seller_path(self, seller_link):
+        return os.path.join(self.directory, f"{seller_key(seller_link)}.json")
+
+    def load_seller(self, seller_link):
+        path = self._seller_path(seller_link)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'seller_link': seller_link, 'run': 0, 'complete': False, 'pages': {}}
+
+    def save_seller(self, checkpoint):
+        write_json_atomic(self._seller_path(checkpoint['seller_link']), checkpoint)
+
+    def is_done(self, checkpoint):
+        done = checkpoint['run'] == self.run and checkpoint['complete']
+        if done:
+            with self._lock:
+                self.sellers_skipped += 1
+                self.sellers_finished.add(checkpoint['seller_link'])
+        return done
+
+    def begin_seller(self, checkpoint):
+        if checkpoint['run'] != self.run:
+            checkpoint['run'] = self.run
+            checkpoint['complete'] = False
+
+    def page_unchanged(self, checkpoint, page_number, fingerprint):
+        page = checkpoint['pages'].get(str(page_number))
+        unchanged = page is not None and page['fingerprint'] == fingerprint
+        if unchanged:
+            with self._lock:
+                self.pages_unchanged += 1
+        return unchanged
+
+    # Store the products of a freshly scraped page and persist them right away
+    def record_page(self, checkpoint, page_number, fingerprint, products):
+        checkpoint['pages'][str(page_number)] = {'fingerprint': fingerprint, 'products': products}
+        self.save_seller(checkpoint)
+        with self._lock:
+            self.pages_scraped += 1
+
+    def finish_seller(self, checkpoint, last_page_number):
+        # Pages beyond the current last page no longer exist on the site
+        for page_number in list(checkpoint['pages']):
+            if int(page_number) > last_page_number:
+                del checkpoint['pages'][page_number]
+        checkpoint['complete'] = True
+        self.save_seller(checkpoint)
+        with self._lock:
+            self.sellers_finished.add(checkpoint['seller_link'])
+
+    # Sellers of the list that did not finish in this run (failed, timed out or never started)
+    def unfinished(self, seller_links):
+        with self._lock:
+            return [link for link in seller_links if link not in self.sellers_finished]
+
+
+# Last stored products of a seller that could not be crawled now, or none if it has no readable checkpoint
+def last_known_products(state, seller_link):
+    try:
+        return checkpoint_products(state.load_seller(seller_link))
+    except Exception as e:
+        print(f"Error reading checkpoint of {seller_link}: {e}")
+        return []
+
+
+# Products of a seller in the same last-to-first page order the crawl uses
+def checkpoint_products(checkpoint):
+    products = []
+    for page_number in sorted(checkpoint['pages'], key=int, reverse=True):
+        products.extend(dict(product) for product in checkpoint['pages'][page_number]['products'])
+    return products
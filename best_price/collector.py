@@ -0,0 +1,43 @@
+import threading
+
+
+# Collects per-seller results from concurrent workers and releases them in
+# seller order, so product ids stay unique and deterministic no matter which
+# worker finishes first. With `sellers` (seller link per index), every product is
+# tagged with the seller it was listed by.
+class OrderedCollector:
+    def __init__(self, start_id=1, sink=None, sellers=None):
+        self.next_id = start_id
+        self.sink = sink
+        self.sellers = sellers
+        self.products = []
+        self._pending = {}
+        self._next_index = 0
+        self._lock = threading.Lock()
+
+    def add(self, index, products):
+        with self._lock:
+            self._pending[index] = products
+            while self._next_index in self._pending:
+                # Move on before emitting, so a failing sink cannot hold back every later seller
+                index = self._next_index
+                self._next_index += 1
+                self._emit(index, self._pending.pop(index))
+
+    def _emit(self, index, products):
+        for product in products:
+            product['id'] = self.next_id
+            if self.sellers is not None:
+                product['seller'] = self.sellers[index]
+            self.next_id += 1
+            if self.sink is None:
+                self.products.append(product)
+                continue
+            try:
+                self.sink(product)
+            except Exception as e:
+                print(f"Error storing product {product.get('link')}: {e}")
+
+    @property
+    def waiting(self):
+        return len(self._pending)
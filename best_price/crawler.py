@@ -1,18 +1,40 @@
+import asyncio
 import json
-import time
+import queue
+import threading
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from auth_data import olx_username, olx_password
-from urllib.parse import urlparse, parse_qs, urlunparse
-
-
-def init_driver():
+from checkpoints import CrawlState, checkpoint_products, last_known_products, page_fingerprint
+from collector import OrderedCollector
+from history import HistoryWriter
+from http_backend import HTTP_CONCURRENCY, crawl_sellers_http
+from listing_parser import get_base_url_with_page
+from prices import normalize_product
+from products_log import PRODUCTS_LOG, ProductWriter
+from store import DB_PATH, ProductLoader
+from waits import CARD_SELECTOR, PAGINATION_SELECTOR, PageLatency, load_page
+
+OLX_HOME = "https://www.olx.ua/uk/"
+CRAWL_WORKERS = 4  # Number of headless drivers crawling seller pages in parallel
+FETCH_BACKEND = 'http'  # 'http' parses server-rendered pages, 'selenium' drives a browser per worker
+SELLER_LINK_SELECTOR = 'div.css-1mzzuk6 > a.css-cj7voq, a.css-1giby4d'
+
+# Load times of all pages opened by the crawl, shared by every worker
+latency = PageLatency()
+
+
+def init_driver(headless=False):
     chrome_options = Options()
-    # chrome_options.add_argument("--headless")  # Remove this line to run in non-headless mode
+    if headless:
+        chrome_options.add_argument("--headless")
+    # Return from driver.get() once the DOM is ready; the waits below decide when the content is there
+    chrome_options.page_load_strategy = 'eager'
     service = Service(r'C:\WebDrivers\chromedriver.exe')  # Update the path if needed
     driver = webdriver.Chrome(service=service, options=chrome_options)
     return driver
@@ -20,7 +42,7 @@ def init_driver():
 
 def login(driver, username, password):
     try:
-        driver.get("https://www.olx.ua/uk/")
+        driver.get(OLX_HOME)
 
         # Click on the profile link to navigate to the login page
         profile_link = WebDriverWait(driver, 10).until(
@@ -44,7 +66,11 @@ def login(driver, username, password):
         # Submit the form to login
         password_field.submit()
 
-        time.sleep(7)  # Allow time for the login process
+        # Wait for the redirect to the account page instead of a fixed pause
+        try:
+            WebDriverWait(driver, latency.timeout(), poll_frequency=0.1).until(EC.url_contains("myaccount"))
+        except TimeoutException:
+            pass
 
         # Verify if login is successful
         current_url = driver.current_url
@@ -75,7 +101,7 @@ def scrape_seller_links(driver):
         seller_links = []
 
         # Find all links on the page that point to sellers
-        seller_elements = driver.find_elements(By.CSS_SELECTOR, 'div.css-1mzzuk6 > a.css-cj7voq, a.css-1giby4d')
+        seller_elements = driver.find_elements(By.CSS_SELECTOR, SELLER_LINK_SELECTOR)
 
         for element in seller_elements:
             link = element.get_attribute('href')
@@ -93,10 +119,10 @@ def scrape_seller_links(driver):
 
 def navigate_to_favorites(driver):
     try:
-        driver.get("https://www.olx.ua/uk/favorites/search/")
-        print("Navigated to Favorites page.")
-
-        time.sleep(7)
+        found, elapsed = load_page(driver, "https://www.olx.ua/uk/favorites/search/", [SELLER_LINK_SELECTOR], latency)
+        print(f"Navigated to Favorites page in {elapsed:.2f}s.")
+        if found is None:
+            print("No seller links appeared on the Favorites page.")
 
         # Proceed to scrape seller links
         scrape_seller_links(driver)
@@ -105,27 +131,44 @@ def navigate_to_favorites(driver):
         print(f"Error navigating to Favorites: {e}")
 
 
-def get_base_url_with_page(url, page):
-    parsed_url = urlparse(url)
-    query_params = parse_qs(parsed_url.query)
-    query_params.pop('min_id', None)  # Remove min_id if it exists
-    query_params.pop('reason', None)  # Remove reason if it exists
-    query_params['page'] = str(page)  # Add the page parameter
-    new_query = '&'.join([f"{key}={value[0]}" for key, value in query_params.items()])
-    new_url = urlunparse((parsed_url.scheme, parsed_url.netloc, parsed_url.path, '', new_query, ''))
-    return new_url
+# Capture the session cookies of a logged-in driver so worker drivers can reuse them
+def get_session_cookies(driver):
+    return driver.get_cookies()
+
+
+def apply_session_cookies(driver, cookies):
+    # Cookies can only be set for the domain that is currently open
+    driver.get(OLX_HOME)
+    for cookie in cookies:
+        try:
+            driver.add_cookie(cookie)
+        except Exception as e:
+            print(f"Error applying cookie {cookie.get('name')}: {e}")
 
 
-def scrape_product_details(driver, seller_link, start_id):
-    products = []
+# Link and price text of every card on the current page, fetched in one round-trip
+def get_card_keys(driver):
+    return driver.execute_script(
+        """return Array.from(document.querySelectorAll(arguments[0])).map(card => {
+            const link = card.querySelector('a.css-13w8mae');
+            const price = card.querySelector('[data-testid="ad-price"]');
+            return [link ? link.href : '', price ? price.innerText : ''];
+        });""",
+        CARD_SELECTOR
+    )
 
+
+def scrape_product_details(driver, seller_link, state, checkpoint):
     try:
         # Find the last page number
-        driver.get(seller_link)
-        time.sleep(5)  # Allow time for the page to load
+        found, elapsed = load_page(driver, seller_link, [CARD_SELECTOR, PAGINATION_SELECTOR], latency)
+        if found is None:
+            # Without the pagination the page count is unknown; keep the checkpoint as it is for a retry
+            print(f"Seller page {seller_link} did not render within the timeout.")
+            return checkpoint_products(checkpoint)
 
         # Locate the pagination list and get the last page number
-        pagination_items = driver.find_elements(By.CSS_SELECTOR, 'li[data-testid="pagination-list-item"] a')
+        pagination_items = driver.find_elements(By.CSS_SELECTOR, PAGINATION_SELECTOR)
         if not pagination_items:
             print(f"No pagination items found on {seller_link}. Scraping only the first page.")
             last_page_number = 1
@@ -133,17 +176,28 @@ def scrape_product_details(driver, seller_link, start_id):
             last_page_number = max([int(item.text) for item in pagination_items if item.text.isdigit()])
 
         # Start scraping from the last page to the first page
+        complete = True
         for page_number in range(last_page_number, 0, -1):
             page_url = get_base_url_with_page(seller_link, page_number)
-            print(f"Scraping page {page_number}: {page_url}")  # Log the page URL being scraped
-            driver.get(page_url)
-            time.sleep(5)  # Allow time for the page to load
-
-            product_elements = driver.find_elements(By.CSS_SELECTOR, '[data-testid="l-card"]')
+            found, elapsed = load_page(driver, page_url, [CARD_SELECTOR], latency)
+            print(f"Loaded page {page_number} in {elapsed:.2f}s: {page_url}")  # Log the page URL and load time
+            if found is None:
+                # A page that timed out is not an empty page: keep its stored products
+                print(f"Page {page_number} did not render within the timeout.")
+                complete = False
+                continue
+
+            # Skip reading card details when the page shows the same listings at the same prices as last time
+            fingerprint = page_fingerprint(get_card_keys(driver))
+            if state.page_unchanged(checkpoint, page_number, fingerprint):
+                print(f"Page {page_number} is unchanged, keeping its products.")
+                continue
+
+            products = []
+            product_elements = driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR)
 
             if not product_elements:
                 print(f"No products found on page {page_number}.")
-                continue  # Continue if no products are found on this page
 
             for element in product_elements:
                 try:
@@ -153,54 +207,153 @@ def scrape_product_details(driver, seller_link, start_id):
                     location = element.find_element(By.CSS_SELECTOR, 'p.css-1pzx3wn').text
                     date_of_publication = element.find_element(By.CSS_SELECTOR, 'p.css-1uf1vew span').text
                     products.append({
-                        'id': start_id,
                         'link': link,
                         'title': title,
                         'price': price,
                         'location': location,
                         'date of publication': date_of_publication
                     })
-                    start_id += 1
                 except Exception as e:
                     print(f"Error scraping product details: {e}")
 
+            state.record_page(checkpoint, page_number, fingerprint, products)
+
+        # A seller with timed-out pages stays incomplete so a resumed run retries it
+        if complete:
+            state.finish_seller(checkpoint, last_page_number)
+
     except Exception as e:
         print(f"Error scraping seller page: {e}")
 
-    return products, start_id
+    return checkpoint_products(checkpoint)
 
 
-def main():
+# Worker loop: one headless driver per thread, pulling seller links from a shared queue
+def crawl_worker(worker_id, tasks, collector, cookies, state):
     driver = None
     try:
-        driver = init_driver()
-        login(driver, olx_username, olx_password)
+        driver = init_driver(headless=True)
+        apply_session_cookies(driver, cookies)
+
+        while True:
+            try:
+                index, seller_link = tasks.get_nowait()
+            except queue.Empty:
+                break
+            products = []
+            try:
+                checkpoint = state.load_seller(seller_link)
+                if state.is_done(checkpoint):
+                    print(f"Seller {index + 1} already crawled in this run: {seller_link}")
+                    products = checkpoint_products(checkpoint)
+                else:
+                    print(f"Worker {worker_id} scraping seller {index + 1}: {seller_link}")
+                    state.begin_seller(checkpoint)
+                    products = scrape_product_details(driver, seller_link, state, checkpoint)
+            except Exception as e:
+                print(f"Error crawling seller {seller_link}: {e}")
+                products = last_known_products(state, seller_link)
+            finally:
+                # Always report the seller, otherwise the collector would wait for it forever
+                collector.add(index, products)
 
-        # Load seller links from JSON file
-        with open('seller_links.json', 'r', encoding='utf-8') as f:
-            seller_links = json.load(f)
+    except Exception as e:
+        print(f"Error in worker {worker_id}: {e}")
+
+    finally:
+        if driver is not None:
+            driver.quit()
 
-        all_products = []
-        current_id = 1
 
-        for seller in seller_links:
-            seller_link = seller['seller_link']
-            products, current_id = scrape_product_details(driver, seller_link, current_id)
-            all_products.extend(products)
+# Shard seller links across a pool of drivers sharing one login session
+def crawl_sellers(seller_links, cookies, collector, state, workers=CRAWL_WORKERS):
+    tasks = queue.Queue()
+    for index, seller in enumerate(seller_links):
+        tasks.put((index, seller['seller_link']))
 
-        # Save all products to prices.json
-        with open('prices.json', 'w', encoding='utf-8') as f:
-            json.dump({'products': all_products}, f, ensure_ascii=False, indent=4)
+    threads = [
+        threading.Thread(target=crawl_worker, args=(worker_id, tasks, collector, cookies, state), daemon=True)
+        for worker_id in range(min(workers, len(seller_links)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
-        print(f"Saved {len(all_products)} products to prices.json")
+    # If every worker failed to start, the sellers are still queued; report what their checkpoints had
+    while not tasks.empty():
+        index, seller_link = tasks.get_nowait()
+        print(f"Seller {seller_link} was not scraped.")
+        collector.add(index, last_known_products(state, seller_link))
+
+
+def main(workers=CRAWL_WORKERS, backend=FETCH_BACKEND):
+    driver = None
+    try:
+        driver = init_driver()
+        login(driver, olx_username, olx_password)
+        cookies = get_session_cookies(driver)
 
     except Exception as e:
         print(f"Error: {e}")
+        return
 
     finally:
         if driver is not None:
             driver.quit()
 
+    writer = None
+    loader = None
+    try:
+        # Load seller links from JSON file
+        with open('seller_links.json', 'r', encoding='utf-8') as f:
+            seller_links = json.load(f)
+
+        state = CrawlState()
+        state.start_run()
+
+        # Products are streamed to the log as soon as their seller is next in order,
+        # with the price parsed once here so readers get numbers
+        writer = ProductWriter(PRODUCTS_LOG)
+        loader = ProductLoader(state.run, DB_PATH)
+        history = HistoryWriter(loader.conn, state.started)
+
+        def ingest(product):
+            normalize_product(product)
+            writer.write(product)
+            loader.write(product)
+            history.record(product)
+
+        sellers = [seller['seller_link'] for seller in seller_links]
+        collector = OrderedCollector(start_id=1, sink=ingest, sellers=sellers)
+        if backend == 'http':
+            asyncio.run(crawl_sellers_http(seller_links, cookies, collector, state, HTTP_CONCURRENCY))
+        else:
+            crawl_sellers(seller_links, cookies, collector, state, workers)
+
+        writer.finish()
+        print(f"Saved {writer.count} products to {PRODUCTS_LOG}")
+        print(f"Page loads: {latency.summary()}")
+
+        # Listings of a seller that did not finish were not seen, not removed: keep them, leave the
+        # run open and let the next start resume it; history only records complete runs
+        unfinished = state.unfinished(sellers)
+        if unfinished:
+            loader.finish(remove_stale=False)
+            print(f"{len(unfinished)} sellers did not finish; keeping old listings, the next run resumes them.")
+        else:
+            loader.finish()
+            history.finish()
+            state.finish_run()
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+    finally:
+        if writer is not None:
+            writer.close()
+        if loader is not None:
+            loader.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+import random
+import re
+import zlib
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands of 4 rows: titles about 60% similar or more usually share a band
+SHINGLE_SIZE = 3
+THRESHOLD = 0.6
+MERSENNE_PRIME = (1 << 61) - 1
+
+WORD_RE = re.compile(r'\w+')
+NUMBER_RE = re.compile(r'\d+')
+
+
+def normalize_title(title):
+    return ' '.join(WORD_RE.findall(str(title).lower()))
+
+
+# Character shingles of the normalized title, hashed to 32 bits
+def shingles(title, size=SHINGLE_SIZE):
+    text = normalize_title(title)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode('utf-8'))}
+    return {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        generator = random.Random(seed)
+        self.permutations = [
+            (generator.randrange(1, MERSENNE_PRIME), generator.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, hashes):
+        return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+
+def similarity(signature, other):
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+# Streaming near-duplicate clustering. Each title is hashed into BANDS LSH buckets and only
+# compared with the clusters already in those buckets, so the cost grows with the number of
+# titles rather than with the number of pairs. The first title of a cluster is its canonical
+# member. Titles that differ in their numbers ("iPhone 12" / "iPhone 13") are never merged,
+# however similar the rest of the text is, so the numbers are part of every bucket key: such
+# titles never even become candidates of each other.
+class Deduplicator:
+    def __init__(self, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.buckets = {}
+        # cluster id -> signature of its canonical member
+        self.clusters = {}
+
+    def add(self, key, title):
+        signature = self.hasher.signature(shingles(title))
+        numbers = tuple(NUMBER_RE.findall(str(title)))
+        band_keys = [
+            (band, numbers, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)
+        ]
+
+        cluster_id = None
+        checked = set()
+        for band_key in band_keys:
+            for candidate in self.buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if similarity(signature, self.clusters[candidate]) >= self.threshold:
+                    cluster_id = candidate
+                    break
+            if cluster_id is not None:
+                break
+
+        if cluster_id is None:
+            cluster_id = key
+            self.clusters[key] = signature
+            for band_key in band_keys:
+                self.buckets.setdefault(band_key, []).append(key)
+        return cluster_id
+
+
+# Cluster (id, title) pairs; with ids in ascending order the canonical member is the oldest listing
+def cluster_titles(items, threshold=THRESHOLD):
+    deduplicator = Deduplicator(threshold)
+    return {key: deduplicator.add(key, title) for key, title in items}
@@ -0,0 +1,184 @@
+import time
+from array import array
+
+CHUNK_SIZE = 256  # Points per chunk; a full chunk is never rewritten
+NO_SELLER = -1
+
+HISTORY_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS sellers (id INTEGER PRIMARY KEY, link TEXT UNIQUE NOT NULL)',
+    '''
+    CREATE TABLE IF NOT EXISTS price_chunks (
+        link TEXT NOT NULL,
+        chunk INTEGER NOT NULL,
+        timestamps BLOB NOT NULL,
+        prices BLOB NOT NULL,
+        sellers BLOB NOT NULL,
+        PRIMARY KEY (link, chunk)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS history_crawls (
+        crawl INTEGER PRIMARY KEY,
+        timestamp REAL NOT NULL,
+        points INTEGER NOT NULL,
+        drops INTEGER NOT NULL,
+        run REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS price_drops (
+        crawl INTEGER NOT NULL,
+        link TEXT NOT NULL,
+        title TEXT,
+        location TEXT,
+        currency TEXT,
+        old_price REAL NOT NULL,
+        new_price REAL NOT NULL,
+        drop_ratio REAL NOT NULL,
+        PRIMARY KEY (crawl, link)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS price_drops_ratio ON price_drops (crawl, drop_ratio)',
+)
+
+# Biggest drops of the latest crawl, optionally in locations starting with the given name
+DROPS_QUERY = '''
+    SELECT link, title, location, currency, old_price, new_price, drop_ratio FROM price_drops
+    WHERE crawl = (SELECT MAX(crawl) FROM history_crawls) AND (? IS NULL OR location LIKE ? || '%')
+    ORDER BY drop_ratio DESC
+    LIMIT ?
+'''
+
+
+# One chunk of a listing's series, stored column by column: parallel arrays of
+# timestamps, prices and seller ids, serialized as raw bytes.
+class PriceChunk:
+    def __init__(self, chunk=0, timestamps=b'', prices=b'', sellers=b''):
+        self.chunk = chunk
+        self.timestamps = array('d', timestamps)
+        self.prices = array('d', prices)
+        self.sellers = array('q', sellers)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def append(self, timestamp, price, seller_id):
+        self.timestamps.append(timestamp)
+        self.prices.append(price)
+        self.sellers.append(seller_id)
+
+    def to_row(self, link):
+        return link, self.chunk, self.timestamps.tobytes(), self.prices.tobytes(), self.sellers.tobytes()
+
+
+# Appends one point per listing to the history at the end of a crawl and stores the listings
+# whose price went down since their previous point, so /drops reads a small precomputed table.
+class HistoryWriter:
+    # run identifies the crawl run (the same when it is resumed); the crawl id is only given
+    # out by finish(), one past the latest in the table, so it never depends on the crawl state
+    def __init__(self, conn, run, timestamp=None, chunk_size=CHUNK_SIZE):
+        self.conn = conn
+        self.run = run
+        self.crawl = None
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.chunk_size = chunk_size
+        self.drops = 0
+        self._points = {}
+
+    def record(self, product):
+        link = product.get('link')
+        if link is None or product.get('price_value') is None:
+            return
+        # Only what the history and the drops need, not the whole product dict
+        self._points[link] = (
+            product['price_value'], product.get('seller'),
+            product.get('title'), product.get('location'), product.get('currency'),
+        )
+
+    def finish(self):
+        recorded = self.conn.execute('SELECT crawl FROM history_crawls WHERE run = ?', (self.run,)).fetchone()
+        if recorded is not None:
+            # A resumed run that already got this far must not append the same points twice
+            print(f"Price history already has this run as crawl {recorded[0]}.")
+            return
+
+        with self.conn:
+            self.crawl = self.conn.execute('SELECT COALESCE(MAX(crawl), 0) + 1 FROM history_crawls').fetchone()[0]
+            seller_ids = self._seller_ids()
+            tails = self._tail_chunks()
+            chunk_rows = []
+            drop_rows = []
+            for link, (price, seller, title, location, currency) in self._points.items():
+                tail = tails.get(link)
+                if tail is None:
+                    tail = PriceChunk()
+                else:
+                    previous = tail.prices[-1]
+                    if price < previous:
+                        drop_rows.append((
+                            self.crawl, link, title, location, currency,
+                            previous, price, (previous - price) / previous if previous else 0.0
+                        ))
+                    if len(tail) >= self.chunk_size:
+                        tail = PriceChunk(tail.chunk + 1)
+                tail.append(self.timestamp, price, seller_ids.get(seller, NO_SELLER))
+                chunk_rows.append(tail.to_row(link))
+
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO price_chunks (link, chunk, timestamps, prices, sellers) VALUES (?, ?, ?, ?, ?)',
+                chunk_rows
+            )
+            self.conn.executemany('INSERT INTO price_drops VALUES (?, ?, ?, ?, ?, ?, ?, ?)', drop_rows)
+            self.conn.execute(
+                'INSERT INTO history_crawls (crawl, timestamp, points, drops, run) VALUES (?, ?, ?, ?, ?)',
+                (self.crawl, self.timestamp, len(chunk_rows), len(drop_rows), self.run)
+            )
+        self.drops = len(drop_rows)
+        print(f"Price history: {len(self._points)} points added, {self.drops} price drops.")
+
+    def _seller_ids(self):
+        sellers = {seller for _, seller, *_ in self._points.values() if seller}
+        self.conn.executemany('INSERT OR IGNORE INTO sellers (link) VALUES (?)', [(seller,) for seller in sellers])
+        return {link: seller_id for seller_id, link in self.conn.execute('SELECT id, link FROM sellers')}
+
+    # Last chunk of every listing seen in this crawl
+    def _tail_chunks(self):
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS crawl_links (link TEXT PRIMARY KEY)')
+        self.conn.execute('DELETE FROM crawl_links')
+        self.conn.executemany('INSERT INTO crawl_links VALUES (?)', [(link,) for link in self._points])
+        rows = self.conn.execute('''
+            SELECT c.link, c.chunk, c.timestamps, c.prices, c.sellers
+            FROM crawl_links l JOIN price_chunks c ON c.link = l.link
+            WHERE c.chunk = (SELECT MAX(chunk) FROM price_chunks WHERE link = l.link)
+        ''')
+        return {link: PriceChunk(chunk, timestamps, prices, sellers) for link, chunk, timestamps, prices, sellers in rows}
+
+
+# Full series of a listing as (timestamp, price, seller link) tuples, oldest first
+def price_series(conn, link):
+    sellers = {}
+    series = []
+    rows = conn.execute(
+        'SELECT chunk, timestamps, prices, sellers FROM price_chunks WHERE link = ? ORDER BY chunk', (link,)
+    ).fetchall()
+    for chunk, timestamps, prices, seller_ids in rows:
+        chunk = PriceChunk(chunk, timestamps, prices, seller_ids)
+        for timestamp, price, seller_id in zip(chunk.timestamps, chunk.prices, chunk.sellers):
+            if seller_id not in sellers:
+                row = conn.execute('SELECT link FROM sellers WHERE id = ?', (seller_id,)).fetchone()
+                sellers[seller_id] = row[0] if row else None
+            series.append((timestamp, price, sellers[seller_id]))
+    return series
+
+
+def row_to_drop(row):
+    link, title, location, currency, old_price, new_price, drop_ratio = row
+    return {
+        'link': link,
+        'title': title,
+        'location': location,
+        'currency': currency,
+        'old_price': old_price,
+        'new_price': new_price,
+        'drop_ratio': drop_ratio,
+    }
@@ -0,0 +1,116 @@
+import asyncio
+from checkpoints import checkpoint_products, last_known_products, page_fingerprint
+from listing_parser import card_to_product, get_base_url_with_page, parse_listing_page
+
+HTTP_CONCURRENCY = 8  # Requests in flight at the same time
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Accept-Language': 'uk-UA,uk;q=0.9',
+}
+
+
+# Fetches seller pages over plain HTTP and parses the server-rendered HTML,
+# so scraping needs no browser at all. Selenium is only used for login and favorites.
+class HttpBackend:
+    def __init__(self, cookies=None, concurrency=HTTP_CONCURRENCY, timeout=30):
+        self.cookies = {cookie['name']: cookie['value'] for cookie in cookies or []}
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            headers=HTTP_HEADERS,
+            cookies=self.cookies,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch_page(self, url):
+        async with self._semaphore:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                return await response.text()
+
+    async def scrape_page(self, page_url):
+        html = await self.fetch_page(page_url)
+        cards, _ = parse_listing_page(html, page_url)
+        return cards
+
+    async def scrape_seller(self, seller_link, state, checkpoint):
+        try:
+            html = await self.fetch_page(seller_link)
+            _, last_page_number = parse_listing_page(html, seller_link)
+
+            # Pages are fetched concurrently but kept in the same last-to-first order as the Selenium crawl
+            page_numbers = range(last_page_number, 0, -1)
+            page_urls = [get_base_url_with_page(seller_link, page) for page in page_numbers]
+            pages = await asyncio.gather(*(self.scrape_page(url) for url in page_urls), return_exceptions=True)
+
+            complete = True
+            for page_number, page_url, cards in zip(page_numbers, page_urls, pages):
+                if isinstance(cards, Exception):
+                    print(f"Error scraping page {page_url}: {cards}")
+                    complete = False
+                    continue
+
+                fingerprint = page_fingerprint((card.get('link', ''), card.get('price', '')) for card in cards)
+                if state.page_unchanged(checkpoint, page_number, fingerprint):
+                    continue
+
+                products = []
+                for card in cards:
+                    product = card_to_product(card)
+                    if product is None:
+                        print(f"Error scraping product details: incomplete card on {page_url}")
+                    else:
+                        products.append(product)
+                if not products:
+                    print(f"No products found on {page_url}.")
+                state.record_page(checkpoint, page_number, fingerprint, products)
+
+            # A seller with failed pages stays incomplete so a resumed run retries it
+            if complete:
+                state.finish_seller(checkpoint, last_page_number)
+
+        except Exception as e:
+            print(f"Error scraping seller page: {e}")
+
+        return checkpoint_products(checkpoint)
+
+
+async def crawl_sellers_http(seller_links, cookies, collector, state, concurrency=HTTP_CONCURRENCY, backend=None):
+    backend = backend or HttpBackend(cookies, concurrency)
+
+    async def crawl_seller(index, seller_link):
+        products = []
+        try:
+            checkpoint = state.load_seller(seller_link)
+            if state.is_done(checkpoint):
+                print(f"Seller {index + 1} already crawled in this run: {seller_link}")
+            else:
+                state.begin_seller(checkpoint)
+                await backend.scrape_seller(seller_link, state, checkpoint)
+            products = checkpoint_products(checkpoint)
+        except Exception as e:
+            # One broken seller (e.g. a corrupt checkpoint) must not abort the whole crawl
+            print(f"Error crawling seller {seller_link}: {e}")
+            products = last_known_products(state, seller_link)
+        finally:
+            # Always report the seller, otherwise the collector would wait for it forever
+            collector.add(index, products)
+
+    async with backend:
+        await asyncio.gather(*(
+            crawl_seller(index, seller['seller_link']) for index, seller in enumerate(seller_links)
+        ))
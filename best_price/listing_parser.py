@@ -0,0 +1,128 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse, parse_qs, urlunparse
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+CARD_FIELDS = ('link', 'title', 'price', 'location', 'date of publication')
+
+
+def get_base_url_with_page(url, page):
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    query_params.pop('min_id', None)  # Remove min_id if it exists
+    query_params.pop('reason', None)  # Remove reason if it exists
+    query_params['page'] = str(page)  # Add the page parameter
+    new_query = '&'.join([f"{key}={value[0]}" for key, value in query_params.items()])
+    new_url = urlunparse((parsed_url.scheme, parsed_url.netloc, parsed_url.path, '', new_query, ''))
+    return new_url
+
+
+def has_class(attrs, name):
+    return name in (attrs.get('class') or '').split()
+
+
+# Extracts the same fields the Selenium crawler reads from a seller page, straight from the
+# server-rendered HTML:
+#   [data-testid="l-card"]           - one product card
+#   a.css-13w8mae (href)             - link
+#   a.css-z3gu2d                     - title
+#   [data-testid="ad-price"]         - price
+#   p.css-1pzx3wn                    - location
+#   p.css-1uf1vew span               - date of publication
+#   li[data-testid="pagination-list-item"] a - page numbers
+class ListingPageParser(HTMLParser):
+    def __init__(self, base_url=''):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.cards = []
+        self.page_numbers = []
+        # Open elements as [tag, field, text parts]; field is None for elements we don't capture
+        self._stack = []
+        self._card = None
+        self._card_depth = None
+
+    def _field_for(self, tag, attrs):
+        if self._card is None:
+            if tag == 'a' and any(entry[1] == 'pagination-item' for entry in self._stack):
+                return 'page'
+            if tag == 'li' and attrs.get('data-testid') == 'pagination-list-item':
+                return 'pagination-item'
+            return None
+
+        if tag == 'a' and has_class(attrs, 'css-13w8mae') and 'link' not in self._card:
+            self._card['link'] = urljoin(self.base_url, attrs.get('href') or '')
+            return None
+        if tag == 'a' and has_class(attrs, 'css-z3gu2d'):
+            return 'title'
+        if attrs.get('data-testid') == 'ad-price':
+            return 'price'
+        if tag == 'p' and has_class(attrs, 'css-1pzx3wn'):
+            return 'location'
+        if tag == 'p' and has_class(attrs, 'css-1uf1vew'):
+            return 'date-paragraph'
+        if tag == 'span' and any(entry[1] == 'date-paragraph' for entry in self._stack):
+            return 'date of publication'
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self._card is None and attrs.get('data-testid') == 'l-card':
+            self._card = {}
+            self._card_depth = len(self._stack)
+            field = None
+        else:
+            field = self._field_for(tag, attrs)
+
+        # Nested elements are rendered as separate words, like Selenium's element.text
+        self.handle_data(' ')
+        if tag not in VOID_TAGS:
+            self._stack.append([tag, field, []])
+
+    def handle_data(self, data):
+        for entry in self._stack:
+            if entry[1] is not None:
+                entry[2].append(data)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        # Close everything up to the matching open tag, tolerating unclosed children
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                while len(self._stack) > index:
+                    self._close(self._stack.pop())
+                return
+
+    def _close(self, entry):
+        tag, field, parts = entry
+        text = ' '.join(''.join(parts).split())
+
+        if field == 'page':
+            if text.isdigit():
+                self.page_numbers.append(int(text))
+        elif field in CARD_FIELDS and self._card is not None:
+            # Like find_element(), only the first match inside the card counts
+            self._card.setdefault(field, text)
+
+        if self._card is not None and len(self._stack) == self._card_depth:
+            self.cards.append(self._card)
+            self._card = None
+            self._card_depth = None
+
+    @property
+    def last_page_number(self):
+        return max(self.page_numbers) if self.page_numbers else 1
+
+
+# Parse one seller page; returns the card dicts (complete or not) and the last page number
+def parse_listing_page(html, base_url=''):
+    parser = ListingPageParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return parser.cards, parser.last_page_number
+
+
+def card_to_product(card):
+    missing = [field for field in CARD_FIELDS if field not in card]
+    if missing:
+        return None
+    return {field: card[field] for field in CARD_FIELDS}
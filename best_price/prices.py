@@ -0,0 +1,45 @@
+import re
+
+CURRENCIES = (
+    ('UAH', ('грн', 'uah', '₴')),
+    ('USD', ('$', 'usd', 'дол')),
+    ('EUR', ('€', 'eur', 'євро')),
+)
+NEGOTIABLE_WORDS = ('договірна', 'торг')
+FREE_WORDS = ('безкоштовно', 'віддам')
+# Digits with space, comma or dot thousands separators, then at most two decimals;
+# a separator followed by exactly three digits is a thousands separator, not decimals
+NUMBER_RE = re.compile(r'\d[\d\s  ]*(?:[.,]\d{3}(?!\d)[\d\s  ]*)*(?:[.,]\d{1,2}(?!\d))?')
+THOUSANDS_RE = re.compile(r'[.,](?=\d{3}(?!\d))')
+
+
+# Parse an OLX price string like "21 200 грн. Договірна" once, at ingest time.
+# Returns the numeric value (None when there is no number, e.g. "Обмін"),
+# the currency code and whether the price is negotiable.
+def parse_price(price):
+    if isinstance(price, (int, float)):
+        return {'price_value': float(price), 'currency': 'UAH', 'negotiable': False}
+
+    text = (price or '').lower()
+    negotiable = any(word in text for word in NEGOTIABLE_WORDS)
+
+    if any(word in text for word in FREE_WORDS):
+        return {'price_value': 0.0, 'currency': 'UAH', 'negotiable': negotiable}
+
+    currency = None
+    for code, markers in CURRENCIES:
+        if any(marker in text for marker in markers):
+            currency = code
+            break
+
+    match = NUMBER_RE.search(text)
+    if match is None:
+        return {'price_value': None, 'currency': currency, 'negotiable': negotiable}
+
+    number = THOUSANDS_RE.sub('', re.sub(r'[\s  ]', '', match.group())).replace(',', '.')
+    return {'price_value': float(number), 'currency': currency or 'UAH', 'negotiable': negotiable}
+
+
+def normalize_product(product):
+    product.update(parse_price(product.get('price')))
+    return product
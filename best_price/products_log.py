@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+PRODUCTS_LOG = 'products.jsonl'
+
+
+# Append-only products log: one JSON object per line. A crawl writes to "<path>.part"
+# and flushes it periodically, so everything written so far is readable after a crash;
+# finish() moves the complete log into place.
+class ProductWriter:
+    def __init__(self, path=PRODUCTS_LOG, flush_every=200, flush_interval=5.0):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._file = open(self.part_path, 'w', encoding='utf-8')
+
+    def write(self, product):
+        self._file.write(json.dumps(product, ensure_ascii=False))
+        self._file.write('\n')
+        self.count += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def finish(self):
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.part_path, self.path)
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+# Lazily iterate the products in a log; a line cut off by a crash is skipped
+def iter_products(path=PRODUCTS_LOG):
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable line in {path}")
+
@@ -0,0 +1,77 @@
+import re
+
+MAX_MESSAGE_LENGTH = 4096
+MARKDOWN_SPECIAL_RE = re.compile(r'([!#\$%&\'\(\)\*\+,\-\.\/:;<=>\?@\[\\\]\^_`\{\|\}~])')
+
+
+def escape_markdown(text):
+    return MARKDOWN_SPECIAL_RE.sub(r'\\\1', str(text))
+
+
+# Split long messages into smaller parts
+def split_message(text, max_length=MAX_MESSAGE_LENGTH):
+    chunks = []
+    while len(text) > max_length:
+        split_pos = text[:max_length].rfind('\n')
+        if split_pos == -1:
+            split_pos = max_length
+        chunks.append(text[:split_pos])
+        text = text[split_pos:].strip()
+    chunks.append(text)
+    return chunks
+
+
+# MarkdownV2 block for one product; products added through the bot have no link, location or date
+def render_product(product, with_location=True):
+    title = escape_markdown(product['title'])
+    if 'link' in product:
+        title = f"[{title}]({escape_markdown(product['link'])})"
+    lines = [f"Title: {title}", f"Price: {escape_markdown(product['price'])}"]
+    if with_location:
+        lines.append(f"Location: {escape_markdown(product.get('location', '-'))}")
+    lines.append(f"Date of publication: {escape_markdown(product.get('date of publication', '-'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+# MarkdownV2 block for a price drop from the crawler's precomputed diff
+def render_drop(drop):
+    title = f"[{escape_markdown(drop['title'])}]({escape_markdown(drop['link'])})"
+    currency = f" {drop['currency']}" if drop['currency'] else ''
+    lines = [
+        f"Title: {title}",
+        escape_markdown(f"Price: {drop['old_price']:g} → {drop['new_price']:g}{currency} "
+                        f"(-{drop['drop_ratio']:.0%})"),
+        f"Location: {escape_markdown(drop['location'] or '-')}",
+    ]
+    return '\n'.join(lines) + '\n\n'
+
+
+# How many of the fragments fit in one message after a header of the given length (at least one)
+def fitting_fragments(header_length, fragments, max_length=MAX_MESSAGE_LENGTH):
+    length = header_length
+    for count, fragment in enumerate(fragments):
+        length += len(fragment)
+        if length > max_length:
+            return max(count, 1)
+    return len(fragments)
+
+
+# Pack pre-rendered fragments into as few messages as possible, splitting only between fragments
+def build_messages(header, fragments, max_length=MAX_MESSAGE_LENGTH):
+    messages = []
+    parts = [header]
+    length = len(header)
+    for fragment in fragments:
+        if length + len(fragment) > max_length and length > 0:
+            messages.append(''.join(parts).strip())
+            parts = []
+            length = 0
+        if len(fragment) > max_length:
+            # A single oversized fragment still has to be cut somewhere
+            messages.extend(split_message(fragment, max_length))
+            continue
+        parts.append(fragment)
+        length += len(fragment)
+    if parts:
+        messages.append(''.join(parts).strip())
+    return [message for message in messages if message]
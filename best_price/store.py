@@ -0,0 +1,256 @@
+import asyncio
+import sqlite3
+import aiosqlite
+from dedup import cluster_titles
+from history import DROPS_QUERY, HISTORY_SCHEMA, row_to_drop
+
+DB_PATH = 'products.db'
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY,
+        link TEXT UNIQUE,
+        title TEXT NOT NULL,
+        price TEXT,
+        price_value REAL,
+        currency TEXT,
+        negotiable INTEGER NOT NULL DEFAULT 0,
+        location TEXT,
+        date_of_publication TEXT,
+        crawl INTEGER,
+        cluster_id INTEGER
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS products_location ON products (location)',
+    'CREATE INDEX IF NOT EXISTS products_price ON products (price_value)',
+) + HISTORY_SCHEMA
+# Schema changes for databases created before them; ALTER TABLE fails harmlessly where they are applied
+UPGRADES = (
+    'ALTER TABLE products ADD COLUMN cluster_id INTEGER',
+    'CREATE INDEX IF NOT EXISTS products_cluster ON products (cluster_id)',
+    'ALTER TABLE history_crawls ADD COLUMN run REAL',
+)
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+)
+COLUMNS = ('link', 'title', 'price', 'price_value', 'currency', 'negotiable', 'location', 'date_of_publication')
+
+
+def product_to_row(product):
+    return (
+        product.get('link'),
+        product['title'],
+        str(product.get('price', '')),
+        product.get('price_value'),
+        product.get('currency'),
+        int(bool(product.get('negotiable'))),
+        product.get('location'),
+        product.get('date of publication'),
+    )
+
+
+def row_to_product(row):
+    product = {
+        'id': row['id'],
+        'title': row['title'],
+        'price': row['price'],
+        'price_value': row['price_value'],
+        'currency': row['currency'],
+        'negotiable': bool(row['negotiable']),
+        # Near-duplicate listings share the id of their canonical listing; others are their own cluster
+        'cluster_id': row['cluster_id'] if row['cluster_id'] is not None else row['id'],
+    }
+    # Products added through the bot have no link, location or date
+    if row['link'] is not None:
+        product['link'] = row['link']
+    if row['location'] is not None:
+        product['location'] = row['location']
+    if row['date_of_publication'] is not None:
+        product['date of publication'] = row['date_of_publication']
+    return product
+
+
+def rows_to_products(rows):
+    return [row_to_product(row) for row in rows]
+
+
+# Bulk loader used by the crawler: products are upserted by link in batched transactions,
+# so a listing keeps its id across crawls. finish() removes listings the crawl no longer saw.
+class ProductLoader:
+    def __init__(self, crawl, path=DB_PATH, batch_size=500):
+        self.crawl = crawl
+        self.batch_size = batch_size
+        self.count = 0
+        self._batch = []
+        # The collector calls write() from worker threads, one at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        for statement in UPGRADES:
+            try:
+                self.conn.execute(statement)
+            except sqlite3.OperationalError:
+                pass
+        self.conn.commit()
+
+    def write(self, product):
+        self._batch.append(product_to_row(product) + (self.crawl,))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        with self.conn:
+            self.conn.executemany(f'''
+                INSERT INTO products ({', '.join(COLUMNS)}, crawl)
+                VALUES ({', '.join('?' * (len(COLUMNS) + 1))})
+                ON CONFLICT(link) DO UPDATE SET
+                    {', '.join(f"{column} = excluded.{column}" for column in COLUMNS[1:])},
+                    crawl = excluded.crawl
+            ''', self._batch)
+        self.count += len(self._batch)
+        self._batch = []
+
+    # remove_stale=False keeps listings this crawl did not see, for a crawl that did not reach every seller
+    def finish(self, remove_stale=True):
+        self.flush()
+        removed = 0
+        if remove_stale:
+            with self.conn:
+                removed = self.conn.execute(
+                    'DELETE FROM products WHERE link IS NOT NULL AND crawl != ?', (self.crawl,)
+                ).rowcount
+        print(f"Loaded {self.count} products into the database, removed {removed} old listings.")
+        self.assign_clusters()
+
+    # Dedup stage: group near-duplicate titles across sellers and point each listing at its cluster
+    def assign_clusters(self):
+        rows = self.conn.execute('SELECT id, title, cluster_id FROM products ORDER BY id').fetchall()
+        clusters = cluster_titles((product_id, title) for product_id, title, _ in rows)
+        changed = [
+            (clusters[product_id], product_id) for product_id, _, cluster_id in rows
+            if cluster_id != clusters[product_id]
+        ]
+        with self.conn:
+            self.conn.executemany('UPDATE products SET cluster_id = ? WHERE id = ?', changed)
+        print(f"Grouped {len(rows)} products into {len(set(clusters.values()))} clusters.")
+
+    def close(self):
+        self.conn.close()
+
+
+# Async access for the bot. Writes are single-row statements that go through one writer
+# task: everything queued while the previous commit was running is applied and committed
+# together, so a burst of handlers costs one commit instead of one per change.
+class ProductStore:
+    def __init__(self, path=DB_PATH, write_batch_size=100):
+        self.path = path
+        self.write_batch_size = write_batch_size
+        self.db = None
+        self.writes = 0
+        self.commits = 0
+        self._queue = None
+        self._writer = None
+
+    async def open(self):
+        self.db = await aiosqlite.connect(self.path)
+        self.db.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await self.db.execute(pragma)
+        for statement in SCHEMA:
+            await self.db.execute(statement)
+        for statement in UPGRADES:
+            try:
+                await self.db.execute(statement)
+            except sqlite3.OperationalError:
+                pass
+        await self.db.commit()
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        if self._writer is not None:
+            # Let the writer finish everything already queued
+            await self._queue.put(None)
+            await self._writer
+            self._writer = None
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+    # Changes whenever another connection (e.g. the crawler) commits
+    async def data_version(self):
+        async with self.db.execute('PRAGMA data_version') as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def all_products(self):
+        async with self.db.execute('SELECT * FROM products ORDER BY id') as cursor:
+            rows = await cursor.fetchall()
+        # Converting a big table is CPU work, keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, rows_to_products, rows)
+
+    # Precomputed by the crawler's HistoryWriter, so this never scans the history itself
+    async def price_drops(self, location=None, limit=10):
+        async with self.db.execute(DROPS_QUERY, (location, location, limit)) as cursor:
+            return [row_to_drop(row) for row in await cursor.fetchall()]
+
+    async def _write(self, sql, params):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sql, params, future))
+        return await future
+
+    async def _write_loop(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.write_batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._apply(batch)
+
+    async def _apply(self, batch):
+        results = []
+        for sql, params, future in batch:
+            try:
+                cursor = await self.db.execute(sql, params)
+                results.append((future, (cursor.lastrowid, cursor.rowcount), None))
+            except Exception as e:
+                results.append((future, None, e))
+
+        try:
+            await self.db.commit()
+        except Exception as e:
+            results = [(future, None, e) for future, _, _ in results]
+        self.writes += len(batch)
+        self.commits += 1
+
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def add(self, product):
+        lastrowid, _ = await self._write(
+            f"INSERT INTO products ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            product_to_row(product)
+        )
+        return lastrowid
+
+    async def delete(self, product_id):
+        _, rowcount = await self._write('DELETE FROM products WHERE id = ?', (product_id,))
+        return rowcount > 0
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import Catalog
+
+
+# Stands in for ProductStore: a fixed product list that never changes
+class FakeStore:
+    def __init__(self, products):
+        self.products = products
+
+    async def data_version(self):
+        return 1
+
+    async def all_products(self):
+        return [dict(product) for product in self.products]
+
+
+PRODUCTS = [
+    {'id': 1, 'title': 'Bike', 'price_value': 100.0, 'location': 'Київ'},
+    {'id': 2, 'title': 'Lamp', 'price_value': 50.0, 'location': 'Львів'},
+]
+
+
+class TestLocationIds(unittest.TestCase):
+
+    def test_ids_survive_a_restart(self):
+        async def run():
+            first = Catalog(FakeStore(PRODUCTS))
+            location_ids = [first.location_id(location) for location in await first.locations()]
+
+            # Another process, or the bot after a restart, sees the locations in a different order
+            second = Catalog(FakeStore(list(reversed(PRODUCTS))))
+            return [await second.location_name(location_id) for location_id in location_ids]
+
+        self.assertEqual(asyncio.run(run()), ['Київ', 'Львів'])
+
+    def test_unknown_id(self):
+        catalog = Catalog(FakeStore(PRODUCTS))
+        self.assertIsNone(asyncio.run(catalog.location_name('0000000000')))
+
+
+
+class TestLowest(unittest.TestCase):
+
+    def test_lowest_within_a_currency(self):
+        catalog = Catalog(FakeStore(PRODUCTS + [
+            {'id': 3, 'title': 'Laptop', 'price_value': 300.0, 'currency': 'USD', 'location': 'Київ'},
+            {'id': 4, 'title': 'Chair', 'price_value': 2000.0, 'currency': 'UAH', 'location': 'Київ'},
+        ]))
+        self.assertEqual([p['id'] for p in asyncio.run(catalog.lowest(3))], [2, 1, 4])
+        self.assertEqual([p['id'] for p in asyncio.run(catalog.lowest(3, 'USD'))], [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from collector import OrderedCollector
+
+
+class TestOrderedCollector(unittest.TestCase):
+
+    def test_released_in_seller_order(self):
+        collector = OrderedCollector(sellers=['a', 'b'])
+        collector.add(1, [{'link': 'b1'}])
+        self.assertEqual(collector.products, [])
+        collector.add(0, [{'link': 'a1'}, {'link': 'a2'}])
+        self.assertEqual([(p['id'], p['seller']) for p in collector.products], [(1, 'a'), (2, 'a'), (3, 'b')])
+        self.assertEqual(collector.waiting, 0)
+
+    def test_failing_sink_does_not_stall_later_sellers(self):
+        stored = []
+
+        def sink(product):
+            if product['link'] == 'bad':
+                raise ValueError('disk full')
+            stored.append(product['link'])
+
+        collector = OrderedCollector(sink=sink)
+        collector.add(0, [{'link': 'bad'}, {'link': 'a2'}])
+        collector.add(1, [{'link': 'b1'}])
+        self.assertEqual(stored, ['a2', 'b1'])
+        self.assertEqual(collector.waiting, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import build_index
+from dedup import Deduplicator, cluster_titles
+
+
+class TestClusterTitles(unittest.TestCase):
+
+    def test_near_duplicates_share_a_cluster(self):
+        clusters = cluster_titles([
+            (1, "Apple iPhone 13 128GB Midnight"),
+            (2, "iPhone 13 128GB Midnight, Apple"),
+            (3, "Apple iPhone 13 128 GB midnight!"),
+            (4, "Дитячий велосипед Formula"),
+        ])
+        self.assertEqual(clusters[1], 1)
+        self.assertEqual(clusters[4], 4)
+        self.assertEqual(clusters[2], 1)
+        self.assertEqual(clusters[3], 1)
+
+    def test_different_numbers_are_not_merged(self):
+        clusters = cluster_titles([(1, "Apple iPhone 12 128GB Midnight"), (2, "Apple iPhone 13 128GB Midnight")])
+        self.assertEqual(clusters, {1: 1, 2: 2})
+
+    def test_titles_with_other_numbers_share_no_bucket(self):
+        deduplicator = Deduplicator()
+        for key in range(1, 201):
+            deduplicator.add(key, f"Apple iPhone 13 128GB Midnight, lot {key}")
+        self.assertEqual(len(deduplicator.clusters), 200)
+        self.assertEqual(max(len(bucket) for bucket in deduplicator.buckets.values()), 1)
+
+    def test_identical_titles(self):
+        clusters = cluster_titles([(key, "Samsung Galaxy S21") for key in range(1, 101)])
+        self.assertEqual(set(clusters.values()), {1})
+
+
+class TestClusterIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = build_index([
+            {'id': 1, 'title': 'iPhone 13', 'price_value': 300.0, 'cluster_id': 1},
+            {'id': 2, 'title': 'iPhone 13', 'price_value': 100.0, 'cluster_id': 1},
+            {'id': 3, 'title': 'iPhone 13', 'price_value': 200.0, 'cluster_id': 1},
+            {'id': 4, 'title': 'Bike', 'price_value': 150.0, 'cluster_id': 4},
+            {'id': 5, 'title': 'Lamp', 'price_value': 250.0},
+        ])
+
+    def test_one_price_entry_per_cluster(self):
+        self.assertEqual(self.index.by_price, [('UAH', 100.0, 2), ('UAH', 150.0, 4), ('UAH', 250.0, 5)])
+
+    def test_removing_the_cheapest_member(self):
+        self.index.remove(2)
+        self.assertEqual(self.index.by_price, [('UAH', 150.0, 4), ('UAH', 200.0, 3), ('UAH', 250.0, 5)])
+        self.index.remove(3)
+        self.index.remove(1)
+        self.assertEqual(self.index.by_price, [('UAH', 150.0, 4), ('UAH', 250.0, 5)])
+
+    def test_adding_a_cheaper_member(self):
+        self.index.add({'id': 6, 'title': 'Bike', 'price_value': 50.0, 'cluster_id': 4})
+        self.assertEqual(self.index.by_price, [('UAH', 50.0, 6), ('UAH', 100.0, 2), ('UAH', 250.0, 5)])
+
+    def test_prices_are_ranked_within_a_currency(self):
+        self.index.add({'id': 7, 'title': 'Bike', 'price_value': 30.0, 'currency': 'USD', 'cluster_id': 4})
+        self.assertEqual(self.index.by_price, [
+            ('UAH', 100.0, 2), ('UAH', 150.0, 4), ('UAH', 250.0, 5), ('USD', 30.0, 7),
+        ])
+        self.index.remove(7)
+        self.assertEqual(self.index.by_price, [('UAH', 100.0, 2), ('UAH', 150.0, 4), ('UAH', 250.0, 5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
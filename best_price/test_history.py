@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history import DROPS_QUERY, HISTORY_SCHEMA, HistoryWriter, price_series, row_to_drop
+
+
+def product(link, price, location='Київ', seller='https://www.olx.ua/uk/list/user/a/'):
+    return {'link': link, 'title': link.upper(), 'price_value': price, 'currency': 'UAH',
+            'location': location, 'seller': seller}
+
+
+class TestPriceHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        for statement in HISTORY_SCHEMA:
+            self.conn.execute(statement)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def crawl(self, run, products, chunk_size=256):
+        history = HistoryWriter(self.conn, run, timestamp=float(run), chunk_size=chunk_size)
+        for item in products:
+            history.record(item)
+        history.finish()
+        return history
+
+    def drops(self, location=None):
+        return [row_to_drop(row) for row in self.conn.execute(DROPS_QUERY, (location, location, 10))]
+
+    def test_series_spans_chunks(self):
+        for crawl in range(1, 6):
+            self.crawl(crawl, [product('a', 100.0 + crawl)], chunk_size=2)
+        series = price_series(self.conn, 'a')
+        self.assertEqual([price for _, price, _ in series], [101.0, 102.0, 103.0, 104.0, 105.0])
+        self.assertEqual(series[0][2], 'https://www.olx.ua/uk/list/user/a/')
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM price_chunks WHERE link = 'a'").fetchone()[0], 3)
+
+    def test_drops_since_last_crawl(self):
+        self.crawl(1, [product('a', 100.0), product('b', 200.0), product('c', 50.0, location='Львів')])
+        history = self.crawl(2, [product('a', 90.0), product('b', 100.0), product('c', 40.0, location='Львів')])
+        self.assertEqual(history.drops, 3)
+        self.assertEqual([drop['link'] for drop in self.drops()], ['b', 'c', 'a'])
+        self.assertEqual([drop['link'] for drop in self.drops('Київ')], ['b', 'a'])
+
+        # Only the latest crawl's diff is served
+        self.crawl(3, [product('a', 95.0), product('b', 100.0)])
+        self.assertEqual(self.drops(), [])
+
+    def test_resumed_crawl_is_not_recorded_twice(self):
+        self.crawl(1, [product('a', 100.0)])
+        self.crawl(1, [product('a', 100.0)])
+        self.assertEqual(len(price_series(self.conn, 'a')), 1)
+
+    def test_crawl_ids_do_not_follow_the_run(self):
+        self.crawl(7, [product('a', 100.0)])
+        # The crawl state was cleared and its runs start again from a smaller value
+        history = self.crawl(1, [product('a', 80.0)])
+        self.assertEqual(history.crawl, 2)
+        self.assertEqual(len(price_series(self.conn, 'a')), 2)
+        self.assertEqual([drop['new_price'] for drop in self.drops()], [80.0])
+
+    def test_products_without_price_are_skipped(self):
+        self.crawl(1, [product('a', None), {'title': 'added in the bot', 'price_value': 10.0}])
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM price_chunks').fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from checkpoints import CrawlState
+from collector import OrderedCollector
+from http_backend import HttpBackend, crawl_sellers_http
+from listing_parser import get_base_url_with_page, parse_listing_page
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SELLER_LINK = 'https://www.olx.ua/uk/list/user/abc/?min_id=1&reason=observed_search'
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+# Serves saved pages instead of going to the network
+class FixtureBackend(HttpBackend):
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.requested = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def fetch_page(self, url):
+        self.requested.append(url)
+        return self.pages[url]
+
+
+class TestListingParser(unittest.TestCase):
+
+    def setUp(self):
+        self.html = read_fixture('seller_page.html')
+
+    def test_cards(self):
+        cards, _ = parse_listing_page(self.html, 'https://www.olx.ua/uk/list/user/abc/')
+        self.assertEqual(len(cards), 3)
+        self.assertEqual(cards[0], {
+            'link': 'https://www.olx.ua/d/uk/obyavlenie/iphone-13-128gb-IDUa1b2.html',
+            'title': 'iPhone 13 128GB',
+            'price': '21 200 грн. Договірна',
+            'location': 'Київ, Печерський',
+            'date of publication': '12 березня 2024 р.',
+        })
+        self.assertEqual(cards[1]['title'], 'Samsung Galaxy S21 & чохол')
+        self.assertEqual(cards[1]['link'], 'https://www.olx.ua/d/uk/obyavlenie/samsung-galaxy-s21-IDUa1b3.html')
+        self.assertNotIn('price', cards[2])
+
+    def test_last_page_number(self):
+        _, last_page_number = parse_listing_page(self.html)
+        self.assertEqual(last_page_number, 3)
+
+    def test_empty_page(self):
+        cards, last_page_number = parse_listing_page(read_fixture('seller_page_empty.html'))
+        self.assertEqual(cards, [])
+        self.assertEqual(last_page_number, 1)
+
+    def crawl(self, state, pages):
+        backend = FixtureBackend(pages)
+        checkpoint = state.load_seller(SELLER_LINK)
+        state.begin_seller(checkpoint)
+        products = asyncio.run(backend.scrape_seller(SELLER_LINK, state, checkpoint))
+        return backend, products
+
+    def test_scrape_seller(self):
+        pages = {SELLER_LINK: self.html}
+        for page in (1, 2, 3):
+            pages[get_base_url_with_page(SELLER_LINK, page)] = self.html
+
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(directory)
+            state.start_run()
+            backend, products = self.crawl(state, pages)
+
+            # Two complete cards on each of the three pages; the card without a price is skipped
+            self.assertEqual(len(products), 6)
+            self.assertEqual(backend.requested[0], SELLER_LINK)
+            self.assertEqual(backend.requested[1], 'https://www.olx.ua/uk/list/user/abc/?page=3')
+            self.assertNotIn('id', products[0])
+            self.assertEqual(state.pages_scraped, 3)
+
+    def test_incremental_crawl(self):
+        pages = {SELLER_LINK: self.html}
+        for page in (1, 2, 3):
+            pages[get_base_url_with_page(SELLER_LINK, page)] = self.html
+
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(directory)
+            state.start_run()
+            self.crawl(state, pages)
+            state.finish_run()
+
+            # Only the second page changed since the last run
+            pages[get_base_url_with_page(SELLER_LINK, 2)] = self.html.replace('IDUa1b2', 'IDUzzzz')
+            state = CrawlState(directory)
+            state.start_run()
+            _, products = self.crawl(state, pages)
+
+            self.assertEqual(state.pages_unchanged, 2)
+            self.assertEqual(state.pages_scraped, 1)
+            self.assertEqual(len(products), 6)
+            self.assertIn('IDUzzzz', products[2]['link'])
+
+            # A seller finished in the current run is not crawled again on resume
+            state = CrawlState(directory)
+            state.run = 2
+            self.assertTrue(state.is_done(state.load_seller(SELLER_LINK)))
+
+    def test_price_change_rescrapes_the_page(self):
+        pages = {SELLER_LINK: self.html}
+        for page in (1, 2, 3):
+            pages[get_base_url_with_page(SELLER_LINK, page)] = self.html
+
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(directory)
+            state.start_run()
+            self.crawl(state, pages)
+            state.finish_run()
+
+            # Same listings on the second page, but one of them got cheaper
+            pages[get_base_url_with_page(SELLER_LINK, 2)] = self.html.replace('21 200', '15 000')
+            state = CrawlState(directory)
+            state.start_run()
+            _, products = self.crawl(state, pages)
+
+            self.assertEqual(state.pages_unchanged, 2)
+            self.assertEqual(state.pages_scraped, 1)
+            self.assertEqual(products[2]['price'], '15 000 грн. Договірна')
+
+    def test_failed_page_leaves_the_seller_unfinished(self):
+        pages = {SELLER_LINK: self.html}
+        for page in (1, 2, 3):
+            pages[get_base_url_with_page(SELLER_LINK, page)] = self.html
+
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(directory)
+            state.start_run()
+            self.crawl(state, pages)
+            self.assertEqual(state.unfinished([SELLER_LINK]), [])
+            state.finish_run()
+
+            # The second page fails to load: its products from the last run are kept
+            del pages[get_base_url_with_page(SELLER_LINK, 2)]
+            state = CrawlState(directory)
+            state.start_run()
+            _, products = self.crawl(state, pages)
+
+            self.assertEqual(len(products), 6)
+            self.assertEqual(state.unfinished([SELLER_LINK]), [SELLER_LINK])
+
+    def test_broken_seller_does_not_abort_the_crawl(self):
+        other_link = 'https://www.olx.ua/uk/list/user/xyz/'
+        pages = {}
+        for link in (SELLER_LINK, other_link):
+            pages[link] = self.html
+            for page in (1, 2, 3):
+                pages[get_base_url_with_page(link, page)] = self.html
+
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(directory)
+            state.start_run()
+            with open(state._seller_path(SELLER_LINK), 'w', encoding='utf-8') as file:
+                file.write('{not json')
+
+            collector = OrderedCollector()
+            sellers = [{'seller_link': SELLER_LINK}, {'seller_link': other_link}]
+            asyncio.run(crawl_sellers_http(sellers, {}, collector, state, backend=FixtureBackend(pages)))
+
+            # The broken seller is reported empty and the next one is still released
+            self.assertEqual(collector.waiting, 0)
+            self.assertEqual(len(collector.products), 6)
+            self.assertEqual(state.unfinished([SELLER_LINK, other_link]), [SELLER_LINK])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from prices import parse_price
+
+
+class TestParsePrice(unittest.TestCase):
+
+    def test_hryvnia(self):
+        self.assertEqual(parse_price("21 200 грн."), {'price_value': 21200.0, 'currency': 'UAH', 'negotiable': False})
+
+    def test_negotiable(self):
+        self.assertEqual(parse_price("21 200 грн. Договірна"),
+                         {'price_value': 21200.0, 'currency': 'UAH', 'negotiable': True})
+
+    def test_negotiable_without_number(self):
+        self.assertEqual(parse_price("Договірна"), {'price_value': None, 'currency': None, 'negotiable': True})
+
+    def test_free(self):
+        self.assertEqual(parse_price("Безкоштовно"), {'price_value': 0.0, 'currency': 'UAH', 'negotiable': False})
+
+    def test_exchange(self):
+        self.assertIsNone(parse_price("Обмін")['price_value'])
+
+    def test_foreign_currency(self):
+        self.assertEqual(parse_price("$ 1 500"), {'price_value': 1500.0, 'currency': 'USD', 'negotiable': False})
+        self.assertEqual(parse_price("99,50 €")['price_value'], 99.5)
+        self.assertEqual(parse_price("99,50 €")['currency'], 'EUR')
+
+    def test_thousands_separators(self):
+        self.assertEqual(parse_price("1,500 $")['price_value'], 1500.0)
+        self.assertEqual(parse_price("1.250.000 грн.")['price_value'], 1250000.0)
+        self.assertEqual(parse_price("1,500.50 $")['price_value'], 1500.5)
+        self.assertEqual(parse_price("12,5 €")['price_value'], 12.5)
+
+    def test_non_breaking_spaces(self):
+        self.assertEqual(parse_price("1 250 000 грн.")['price_value'], 1250000.0)
+
+    def test_number(self):
+        self.assertEqual(parse_price(350.5)['price_value'], 350.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
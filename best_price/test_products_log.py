@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from products_log import ProductWriter, iter_products
+
+PRODUCTS = [
+    {'id': 1, 'title': 'Велосипед', 'price_value': 2000.0},
+    {'id': 2, 'title': 'Lamp', 'price_value': 50.0},
+]
+
+
+class TestProductsLog(unittest.TestCase):
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'products.jsonl')
+            writer = ProductWriter(path)
+            for product in PRODUCTS:
+                writer.write(product)
+            writer.finish()
+
+            self.assertFalse(os.path.exists(writer.part_path))
+            self.assertEqual(writer.count, 2)
+            self.assertEqual(list(iter_products(path)), PRODUCTS)
+
+    def test_crash_leaves_a_readable_part_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'products.jsonl')
+            writer = ProductWriter(path)
+            for product in PRODUCTS:
+                writer.write(product)
+            writer.flush()
+            # The process died in the middle of the next line
+            writer._file.write('{"id": 3, "title": "Cha')
+            writer.close()
+
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(list(iter_products(writer.part_path)), PRODUCTS)
+
+    def test_missing_log(self):
+        self.assertEqual(list(iter_products('/nonexistent/products.jsonl')), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from render import build_messages, fitting_fragments
+
+
+class TestFittingFragments(unittest.TestCase):
+
+    def test_all_fit(self):
+        self.assertEqual(fitting_fragments(10, ['a' * 100] * 3, max_length=400), 3)
+
+    def test_page_is_cut_to_one_message(self):
+        fragments = ['a' * 100] * 5
+        count = fitting_fragments(50, fragments, max_length=400)
+        self.assertEqual(count, 3)
+        self.assertEqual(len(build_messages('h' * 50, fragments[:count], max_length=400)), 1)
+
+    def test_at_least_one(self):
+        self.assertEqual(fitting_fragments(10, ['a' * 500, 'b'], max_length=400), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
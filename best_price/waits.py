@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import deque
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+CARD_SELECTOR = '[data-testid="l-card"]'
+PAGINATION_SELECTOR = 'li[data-testid="pagination-list-item"] a'
+
+
+# Keeps the load times of recent pages and derives the wait timeout from them,
+# so a slow page gets more time only when the site is actually slow right now
+class PageLatency:
+    def __init__(self, window=50, initial_timeout=15.0, min_timeout=3.0, max_timeout=30.0, factor=3.0):
+        self.samples = deque(maxlen=window)
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.pages = 0
+        self.total = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            self.pages += 1
+            self.total += seconds
+            if timed_out:
+                self.timeouts += 1
+            # A timed-out load counts as a sample at the time it was given, so when the site
+            # slows down the timeout grows instead of every page timing out at the old value
+            self.samples.append(seconds)
+
+    def timeout(self):
+        with self._lock:
+            if len(self.samples) < 5:
+                return self.initial_timeout
+            ordered = sorted(self.samples)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.factor))
+
+    def summary(self):
+        with self._lock:
+            average = self.total / self.pages if self.pages else 0.0
+            return f"{self.pages} pages, average load {average:.2f}s, {self.timeouts} timeouts"
+
+
+# Wait until any of the CSS selectors matches; returns the matching selector or None on timeout
+def wait_for_any(driver, selectors, timeout):
+    def first_present(d):
+        for selector in selectors:
+            if d.find_elements(By.CSS_SELECTOR, selector):
+                return selector
+        return False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(first_present)
+    except TimeoutException:
+        return None
+
+
+# Open a page and return as soon as one of the selectors is present, recording its load time
+def load_page(driver, url, selectors, latency):
+    start = time.perf_counter()
+    driver.get(url)
+    found = wait_for_any(driver, selectors, latency.timeout())
+    elapsed = time.perf_counter() - start
+    latency.record(elapsed, timed_out=found is None)
+    return found, elapsed
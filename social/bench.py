@@ -0,0 +1,128 @@
+import argparse
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+from datetime import datetime
+from itertools import accumulate
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, latencies):
+    print(f"{name}: {len(latencies)} queries, "
+          f"p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"max {max(latencies) * 1000:.2f} ms")
+
+
+# The post module opens SOCIAL_DB on import, so point it at a scratch database first
+def scratch_post_module(directory):
+    path = os.path.join(directory, 'bench.db')
+    os.environ['SOCIAL_DB'] = path
+    import post
+    return post
+
+
+# Words with a Zipf-like frequency, so queries hit both rare and very common words
+def make_vocabulary(size, generator):
+    words = {''.join(generator.choices(string.ascii_lowercase, k=generator.randint(3, 9))) for _ in range(size)}
+    words = sorted(words)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+
+def bench_search(args):
+    generator = random.Random(1)
+    words, cum_weights = make_vocabulary(args.vocabulary, generator)
+    with tempfile.TemporaryDirectory() as directory:
+        post = scratch_post_module(directory)
+
+        started = time.perf_counter()
+        now = datetime.now()
+        for start in range(0, args.posts, 10000):
+            rows = []
+            for _ in range(min(10000, args.posts - start)):
+                text = ' '.join(generator.choices(words, cum_weights=cum_weights, k=args.words))
+                rows.append((f"user{generator.randrange(1000)}", text, now, 0, 0, None))
+            with post.db.transaction():
+                post.db.write_many(post.INSERT_POST, rows)
+        print(f"Inserted and indexed {args.posts} posts in {time.perf_counter() - started:.1f} s")
+
+        # The few most frequent words are in most posts, like stop words; real queries skip those
+        searchable = words[50:5000]
+        queries = [' '.join(generator.sample(searchable, generator.randint(1, 2))) for _ in range(args.queries)]
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            post.Post.search(query, 10)
+            latencies.append(time.perf_counter() - started)
+        report("FTS5 search", latencies)
+
+        latencies = []
+        for query in queries[:args.like_queries]:
+            conditions = ' AND '.join('text LIKE ?' for _ in query.split())
+            started = time.perf_counter()
+            post.db.query(f'SELECT id FROM posts WHERE {conditions}',
+                          [f'%{word}%' for word in query.split()])
+            latencies.append(time.perf_counter() - started)
+        report("LIKE scan", latencies)
+        post.db.close()
+
+
+def bench_hashing(args):
+    os.environ['BCRYPT_ROUNDS'] = str(args.rounds)
+    with tempfile.TemporaryDirectory() as directory:
+        post = scratch_post_module(directory)
+        from passwords import PasswordHasher
+
+        password = 'Bench-password1!'
+        password_hash = post.User.hash_password(password)
+        with post.db.transaction():
+            post.db.write_many('INSERT INTO users (username, password_hash) VALUES (?, ?)',
+                               [(f"user{number}", password_hash) for number in range(args.users)])
+
+        cores = os.cpu_count() or 1
+        for workers in sorted({1, cores}):
+            post.hasher = PasswordHasher(args.rounds, workers)
+            started = time.perf_counter()
+            futures = [post.User.login(f"user{number % args.users}", password) for number in range(args.logins)]
+            assert all(future.result() for future in futures)
+            elapsed = time.perf_counter() - started
+            post.hasher.shutdown()
+            rate = args.logins / elapsed
+            print(f"{workers} worker(s), cost {args.rounds}: {rate:.1f} logins/s, "
+                  f"{rate / min(workers, cores):.1f} per core")
+        post.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the social app's storage")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search = commands.add_parser('search', help='full-text search latency against a LIKE scan')
+    search.add_argument('--posts', type=int, default=1000000)
+    search.add_argument('--words', type=int, default=12, help='words per post')
+    search.add_argument('--vocabulary', type=int, default=20000)
+    search.add_argument('--queries', type=int, default=200)
+    search.add_argument('--like-queries', type=int, default=5)
+    search.set_defaults(run=bench_search)
+
+    hashing = commands.add_parser('hashing', help='bcrypt logins per second on the hashing pool')
+    hashing.add_argument('--rounds', type=int, default=12)
+    hashing.add_argument('--users', type=int, default=100)
+    hashing.add_argument('--logins', type=int, default=64)
+    hashing.set_defaults(run=bench_hashing)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import atexit
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get('SOCIAL_DB', 'social.db')
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    # With WAL, NORMAL only syncs at checkpoints: a power cut can lose the last commits, never corrupt the file
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+)
+
+
+# One connection shared by the whole app. Writes open a transaction and are committed
+# together: after commit_interval seconds, once max_pending writes have piled up, on
+# flush() or on close(), so a burst of clicks costs one commit instead of one each.
+# transaction() groups writes that must commit (or roll back) as a unit. Statements are
+# prepared once per distinct SQL string and reused from the connection's cache.
+class Database:
+    def __init__(self, path=DB_PATH, commit_interval=0.05, max_pending=1000, cached_statements=256):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_pending = max_pending
+        # isolation_level=None: transactions are opened and committed here, not by the module
+        self.conn = sqlite3.connect(
+            path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=cached_statements,
+        )
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.lock = threading.RLock()
+        self.pending = 0
+        self.commits = 0
+        self._depth = 0
+        self._timer = None
+        self.closed = False
+        # Commit what is still pending if the program exits without close()
+        atexit.register(self.close)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def write(self, sql, params=()):
+        with self.lock:
+            self._begin()
+            cursor = self.conn.execute(sql, params)
+            self._written(1)
+            return cursor
+
+    # A write that returns a row (UPDATE ... RETURNING); the row is read before anything can commit
+    def write_one(self, sql, params=()):
+        with self.lock:
+            self._begin()
+            row = self.conn.execute(sql, params).fetchone()
+            self._written(1)
+            return row
+
+    def write_many(self, sql, seq_of_params):
+        with self.lock:
+            self._begin()
+            cursor = self.conn.executemany(sql, seq_of_params)
+            self._written(max(cursor.rowcount, 1))
+            return cursor
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self._depth == 0:
+                # Commit earlier writes first, so a rollback only undoes this block
+                self._commit()
+                self._begin()
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0 and self.conn.in_transaction:
+                    self.conn.execute('ROLLBACK')
+                    self.pending = 0
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._commit()
+
+    def flush(self):
+        with self.lock:
+            if self._depth == 0:
+                self._commit()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            self.conn.close()
+            self.closed = True
+
+    def _begin(self):
+        if not self.conn.in_transaction:
+            self.conn.execute('BEGIN')
+
+    def _written(self, count):
+        self.pending += count
+        if self._depth:
+            return
+        if self.pending >= self.max_pending or self.commit_interval <= 0:
+            self._commit()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.commit_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _commit(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.conn.in_transaction:
+            self.conn.execute('COMMIT')
+            self.commits += 1
+        self.pending = 0
+
@@ -0,0 +1,129 @@
+# Schema steps, applied in order. PRAGMA user_version holds the number of steps a database has
+# had, so startup on an up-to-date database is a single PRAGMA read. Each step runs in its own
+# transaction together with the version bump. Steps only ever add: databases made before the
+# runner existed (version 0) may already have some of the objects, so steps check first.
+
+
+def column_names(conn, table):
+    # table_xinfo also lists generated columns
+    return {row[1] for row in conn.execute(f'PRAGMA table_xinfo({table})')}
+
+
+def table_exists(conn, name):
+    return conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (name,)).fetchone() is not None
+
+
+def create_base_tables(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password_hash TEXT
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        author TEXT,
+        text TEXT,
+        created_at DATETIME,
+        likes INTEGER DEFAULT 0,
+        dislikes INTEGER DEFAULT 0,
+        user_id TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(username)
+    )
+    ''')
+    # Posts tables from before user_id
+    if 'user_id' not in column_names(conn, 'posts'):
+        conn.execute('ALTER TABLE posts ADD COLUMN user_id TEXT')
+
+
+# Rating as a generated column, so the feed can read posts in rating order straight off an index
+def add_rating_index(conn):
+    if 'rating' not in column_names(conn, 'posts'):
+        conn.execute('ALTER TABLE posts ADD COLUMN rating INTEGER GENERATED ALWAYS AS (likes - dislikes) VIRTUAL')
+    conn.execute('CREATE INDEX IF NOT EXISTS posts_feed ON posts (rating DESC, id DESC)')
+
+
+# Full-text index over the posts, kept in sync by triggers; it stores only the index, the text stays in posts
+def add_search_index(conn):
+    if not table_exists(conn, 'posts_fts'):
+        conn.execute("CREATE VIRTUAL TABLE posts_fts USING fts5(text, author, content='posts', content_rowid='id')")
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts (rowid, text, author) VALUES (new.id, new.text, new.author);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, text, author) VALUES ('delete', old.id, old.text, old.author);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF text, author ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, text, author) VALUES ('delete', old.id, old.text, old.author);
+        INSERT INTO posts_fts (rowid, text, author) VALUES (new.id, new.text, new.author);
+    END
+    ''')
+    # Index whatever posts are already there
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
+
+def add_sessions(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        FOREIGN KEY (username) REFERENCES users(username)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)')
+
+
+# Comments, read per post in time order, with a per-post count kept on posts by triggers
+# so the feed never has to count them
+def add_comments(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER NOT NULL,
+        author TEXT,
+        text TEXT,
+        created_at DATETIME,
+        FOREIGN KEY (post_id) REFERENCES posts(id)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS comments_post ON comments (post_id, created_at)')
+    if 'comment_count' not in column_names(conn, 'posts'):
+        conn.execute('ALTER TABLE posts ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS comments_count_insert AFTER INSERT ON comments BEGIN
+        UPDATE posts SET comment_count = comment_count + 1 WHERE id = new.post_id;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS comments_count_delete AFTER DELETE ON comments BEGIN
+        UPDATE posts SET comment_count = comment_count - 1 WHERE id = old.post_id;
+    END
+    ''')
+    conn.execute('UPDATE posts SET comment_count = (SELECT COUNT(*) FROM comments WHERE post_id = posts.id)')
+
+
+MIGRATIONS = (
+    create_base_tables,
+    add_rating_index,
+    add_search_index,
+    add_sessions,
+    add_comments,
+)
+
+
+def migrate(db, migrations=MIGRATIONS):
+    version = db.query_one('PRAGMA user_version')[0]
+    for number, step in enumerate(migrations[version:], start=version + 1):
+        with db.transaction():
+            step(db.conn)
+            db.conn.execute(f'PRAGMA user_version = {number}')
+        print(f"Applied migration {number}: {step.__name__}")
+    return len(migrations)
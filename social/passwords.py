@@ -0,0 +1,56 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+# Work factor for new hashes; each step doubles the cost (12 is about 250 ms per hash)
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+
+def to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+# Cost factor a hash was made with, read from its "$2b$12$..." prefix
+def hash_rounds(password_hash):
+    return int(to_bytes(password_hash).split(b'$')[2])
+
+
+# bcrypt on a bounded pool of threads: bcrypt releases the GIL, so logins arriving together
+# are hashed in parallel (one per core by default) without holding up the calling thread.
+# Every method returns a concurrent.futures.Future; the *_async variants can be awaited.
+class PasswordHasher:
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=None):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+
+    def hash(self, password):
+        return self.executor.submit(self.hashpw, password)
+
+    def verify(self, password, password_hash):
+        return self.executor.submit(self.checkpw, password, password_hash)
+
+    # Run a function that does its own hashing on the pool, e.g. a whole login
+    def submit(self, function, *args):
+        return self.executor.submit(function, *args)
+
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self.hash(password))
+
+    async def verify_async(self, password, password_hash):
+        return await asyncio.wrap_future(self.verify(password, password_hash))
+
+    # Hashes made before the work factor was changed are replaced on the next successful login
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    # Blocking versions, for code already running on the pool
+    def hashpw(self, password):
+        return bcrypt.hashpw(to_bytes(password), bcrypt.gensalt(self.rounds))
+
+    def checkpw(self, password, password_hash):
+        return bcrypt.checkpw(to_bytes(password), to_bytes(password_hash))
@@ -1,7 +1,13 @@
 from datetime import datetime
 import sqlite3
 import re
-import bcrypt
+import weakref
+from collections import defaultdict
+from db import DB_PATH, Database
+from migrations import migrate
+from passwords import PasswordHasher
+from sessions import SessionStore
+from votes import VoteBuffer
 
 # SQLite setup with custom datetime handling
 def adapt_datetime(dt):
@@ -15,75 +21,103 @@ def convert_datetime(dt_str):
 sqlite3.register_adapter(datetime, adapt_datetime)
 sqlite3.register_converter("DATETIME", convert_datetime)
 
-# Database setup
-conn = sqlite3.connect('social.db', detect_types=sqlite3.PARSE_DECLTYPES)
-c = conn.cursor()
-
-# Create tables if they do not exist
-c.execute('''
-CREATE TABLE IF NOT EXISTS users (
-    username TEXT PRIMARY KEY,
-    password_hash TEXT
-)
-''')
-
-# Check if the user_id column exists, if not add it
-c.execute("PRAGMA table_info(posts)")
-columns = [column[1] for column in c.fetchall()]
-if 'user_id' not in columns:
-    c.execute('ALTER TABLE posts ADD COLUMN user_id TEXT')
-else:
-    # Drop and recreate the posts table with the new schema
-    c.execute('DROP TABLE IF EXISTS posts')
-    c.execute('''
-    CREATE TABLE posts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        author TEXT,
-        text TEXT,
-        created_at DATETIME,
-        likes INTEGER DEFAULT 0,
-        dislikes INTEGER DEFAULT 0,
-        user_id TEXT,
-        FOREIGN KEY (user_id) REFERENCES users(username)
-    )
-    ''')
-
-conn.commit()
+# Database setup: one connection, writes are group-committed (see db.Database),
+# and the schema is brought up to date by the pending steps in migrations.py
+db = Database(DB_PATH)
+migrate(db)
+# Likes and dislikes are written behind, summed per post (see votes.VoteBuffer)
+votes = VoteBuffer(db)
+# bcrypt runs on a bounded thread pool (see passwords.PasswordHasher)
+hasher = PasswordHasher()
+# Logged-in users carry a session token; checking it skips bcrypt (see sessions.SessionStore)
+sessions = SessionStore(db)
+sessions.purge_expired()
+
+INSERT_POST = '''
+INSERT INTO posts (author, text, created_at, likes, dislikes, user_id)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+# A vote is one statement: a missing post simply updates (and returns) nothing
+VOTE_POST = '''
+UPDATE posts SET likes = likes + ?, dislikes = dislikes + ? WHERE id = ?
+RETURNING likes, dislikes
+'''
+POST_EXISTS = 'SELECT 1 FROM posts WHERE id = ?'
+POST_COUNTS = 'SELECT likes, dislikes FROM posts WHERE id = ?'
+POST_COLUMNS = 'id, author, text, created_at, likes, dislikes, comment_count'
+# Keyset pagination: each page starts after the stored (rating, id) of the last post shown
+FEED_FIRST_PAGE = f'SELECT {POST_COLUMNS}, rating FROM posts ORDER BY rating DESC, id DESC LIMIT ?'
+FEED_NEXT_PAGE = f'''
+SELECT {POST_COLUMNS}, rating FROM posts WHERE (rating, id) < (?, ?)
+ORDER BY rating DESC, id DESC LIMIT ?
+'''
+# Ranked full-text matches; the next page starts after the (rank, id) of the last match shown
+SEARCH_POSTS = '''
+SELECT p.id, p.author, p.text, p.created_at, p.likes, p.dislikes, p.comment_count,
+       snippet(posts_fts, 0, '[', ']', '...', 12), posts_fts.rank
+FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+WHERE posts_fts MATCH ? AND (posts_fts.rank, p.id) > (?, ?)
+ORDER BY posts_fts.rank, p.id
+LIMIT ?
+'''
+
+INSERT_COMMENT = 'INSERT INTO comments (post_id, author, text, created_at) VALUES (?, ?, ?, ?)'
+COMMENT_COLUMNS = 'id, post_id, author, text, created_at'
+# The newest comments of several posts at once, oldest first within each post
+COMMENTS_FOR_POSTS = '''
+SELECT {columns} FROM (
+    SELECT {columns}, ROW_NUMBER() OVER (PARTITION BY post_id ORDER BY created_at DESC, id DESC) AS position
+    FROM comments WHERE post_id IN ({placeholders})
+) WHERE position <= ?
+ORDER BY post_id, created_at, id
+'''
+
+
+# Every word of the query must match; words are quoted so FTS5 operators in user input are plain text
+def fts_query(query):
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in query.split())
 
 class Content:
-    def __init__(self, author):
+    def __init__(self, author, prompt="Write your post: "):
         self.author = author
-        self.text = input("Write your post: ")
+        self.text = input(prompt)
         self.created_at = datetime.now()
 
     def __str__(self):
         return f"{self.author} said at {self.created_at}: {self.text}"
 
 class Post(Content):
-    entries = []
+    # Post objects still in use, by id, so votes can update them without a scan
+    cache = weakref.WeakValueDictionary()
 
     def __init__(self, author):
         super().__init__(author)
         self.likes = 0
         self.dislikes = 0
+        self.comment_count = 0
         self.save_post()
-        Post.entries.append(self)
+        Post.cache[self.id] = self
+
+    # Build a post from a row of POST_COLUMNS without asking for input; votes not written yet are added
+    @classmethod
+    def from_row(cls, row):
+        post = cls.__new__(cls)
+        post.id, post.author, post.text, post.created_at, likes, dislikes, post.comment_count = row
+        post.likes, post.dislikes = votes.merged(post.id, (likes, dislikes))
+        cls.cache[post.id] = post
+        return post
 
     @property
     def rating(self):
         return self.likes - self.dislikes
 
     def save_post(self):
-        c.execute('''
-        INSERT INTO posts (author, text, created_at, likes, dislikes, user_id)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (self.author, self.text, self.created_at, self.likes, self.dislikes, self.author))
-        self.id = c.lastrowid
-        conn.commit()
+        cursor = db.write(INSERT_POST, (self.author, self.text, self.created_at, self.likes, self.dislikes, self.author))
+        self.id = cursor.lastrowid
 
     def __str__(self):
         return (f"#{self.id} {self.author} said: {self.text}. "
-                + f"Likes: {self.likes} | Dislikes: {self.dislikes}")
+                + f"Likes: {self.likes} | Dislikes: {self.dislikes} | Comments: {self.comment_count}")
 
     def __lt__(self, other):
         return self.rating < other.rating
@@ -103,27 +137,120 @@ class Post(Content):
     def __ge__(self, other):
         return self.rating >= other.rating
 
+    # One page of the feed, best rated first, and the cursor for the next page (None on the last page)
+    @classmethod
+    def feed(cls, limit=10, cursor=None):
+        # Ordered by the written counts; votes still in the buffer only change the numbers shown,
+        # so the cursor is built from the stored rating, not from the merged counts
+        with db.lock:
+            if cursor is None:
+                rows = db.query(FEED_FIRST_PAGE, (limit,))
+            else:
+                rows = db.query(FEED_NEXT_PAGE, (*cursor, limit))
+            posts = [cls.from_row(row[:-1]) for row in rows]
+        next_cursor = (rows[-1][-1], rows[-1][0]) if len(rows) == limit else None
+        return posts, next_cursor
+
+    # Posts matching every word of the query, best match first, as (post, snippet) pairs,
+    # plus the cursor for the next page (None on the last page)
     @classmethod
-    def show_posts(cls):
-        for entry in sorted(cls.entries, reverse=True):
-            print(entry)
+    def search(cls, query, limit=10, cursor=None):
+        match = fts_query(query)
+        if not match:
+            return [], None
+        rank, post_id = cursor if cursor is not None else (float('-inf'), 0)
+        with db.lock:
+            rows = db.query(SEARCH_POSTS, (match, rank, post_id, limit))
+            results = [(cls.from_row(row[:-2]), row[-2]) for row in rows]
+        next_cursor = (rows[-1][-1], rows[-1][0]) if len(rows) == limit else None
+        return results, next_cursor
+
+    @classmethod
+    def show_search(cls):
+        query = input("Search for: ")
+        results, cursor = cls.search(query, 10)
+        if not results:
+            print("No posts found.")
+        while results:
+            for post, snippet in results:
+                print(f"#{post.id} {post.author}: {snippet}")
+            if cursor is None or input("Show more? (y/n): ").strip().lower() != 'y':
+                break
+            results, cursor = cls.search(query, 10, cursor)
+
+    @classmethod
+    def show_posts(cls, page_size=10):
+        cursor = None
+        while True:
+            posts, cursor = cls.feed(page_size, cursor)
+            # Latest comments of the whole page in one query
+            comments = Comment.for_posts([entry.id for entry in posts], per_post=3)
+            for entry in posts:
+                print(entry)
+                for comment in comments.get(entry.id, []):
+                    print(f"    {comment}")
+            if cursor is None or input("Show more? (y/n): ").strip().lower() != 'y':
+                break
 
     @classmethod
     def find_by_id(cls, post_id):
-        c.execute('SELECT * FROM posts WHERE id = ?', (post_id,))
-        post = c.fetchone()
-        return post
+        return db.query_one('SELECT * FROM posts WHERE id = ?', (post_id,))
+
+    # Current (likes, dislikes) of a post including buffered votes, or None if there is no such post
+    @classmethod
+    def counts(cls, post_id):
+        with db.lock:
+            row = db.query_one(POST_COUNTS, (post_id,))
+            return votes.merged(post_id, row) if row is not None else None
+
+    # Add votes to a post through the write-behind buffer; returns False if there is no such post.
+    # A post that is not cached costs one existence check; use counts() for the new numbers.
+    @classmethod
+    def vote(cls, post_id, likes=0, dislikes=0):
+        post = cls.cache.get(post_id)
+        if post is None:
+            if db.query_one(POST_EXISTS, (post_id,)) is None:
+                return False
+            votes.add(post_id, likes, dislikes)
+            return True
+        votes.add(post_id, likes, dislikes)
+        post.likes += likes
+        post.dislikes += dislikes
+        return True
+
+    # Write votes straight to the table with one statement
+    @classmethod
+    def _write_votes(cls, post_id, likes, dislikes):
+        counts = db.write_one(VOTE_POST, (likes, dislikes, post_id))
+        if counts is None:
+            return None
+        counts = votes.merged(post_id, counts)
+        post = cls.cache.get(post_id)
+        if post is not None:
+            post.likes, post.dislikes = counts
+        return counts
+
+    # Apply a stream of (post_id, likes, dislikes) votes: summed per post, one statement per post,
+    # one transaction for all of them. Returns {post_id: (likes, dislikes)} for the posts that exist.
+    @classmethod
+    def vote_many(cls, votes):
+        totals = defaultdict(lambda: [0, 0])
+        for post_id, likes, dislikes in votes:
+            total = totals[post_id]
+            total[0] += likes
+            total[1] += dislikes
+        results = {}
+        with db.transaction():
+            for post_id, (likes, dislikes) in totals.items():
+                counts = cls._write_votes(post_id, likes, dislikes)
+                if counts is not None:
+                    results[post_id] = counts
+        return results
 
     @classmethod
     def like(cls):
         post_id = int(input("Enter post id: "))
-        post = cls.find_by_id(post_id)
-        if post:
-            c.execute('UPDATE posts SET likes = likes + 1 WHERE id = ?', (post_id,))
-            conn.commit()
-            for entry in cls.entries:
-                if entry.id == post_id:
-                    entry.likes += 1
+        if cls.vote(post_id, likes=1):
             print("Post liked.")
         else:
             print("Post not found.")
@@ -131,13 +258,7 @@ class Post(Content):
     @classmethod
     def dislike(cls):
         post_id = int(input("Enter post id: "))
-        post = cls.find_by_id(post_id)
-        if post:
-            c.execute('UPDATE posts SET dislikes = dislikes + 1 WHERE id = ?', (post_id,))
-            conn.commit()
-            for entry in cls.entries:
-                if entry.id == post_id:
-                    entry.dislikes += 1
+        if cls.vote(post_id, dislikes=1):
             print("Post disliked.")
         else:
             print("Post not found.")
@@ -145,11 +266,25 @@ class Post(Content):
 class User:
     @staticmethod
     def hash_password(password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        return hasher.hash(password).result()
 
     @staticmethod
     def check_password(password, password_hash):
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash)
+        return hasher.verify(password, password_hash).result()
+
+    # Check a login on the hashing pool; the future resolves to the username, or False
+    @classmethod
+    def login(cls, username, password):
+        return hasher.submit(cls._login, username, password)
+
+    @staticmethod
+    def _login(username, password):
+        user = db.query_one('SELECT password_hash FROM users WHERE username = ?', (username,))
+        if user is None or not hasher.checkpw(password, user[0]):
+            return False
+        if hasher.needs_rehash(user[0]):
+            db.write('UPDATE users SET password_hash = ? WHERE username = ?', (hasher.hashpw(password), username))
+        return username
 
     @staticmethod
     def is_password_strong(password):
@@ -168,8 +303,7 @@ class User:
     @classmethod
     def register_user(cls):
         username = input("Enter a unique login: ")
-        c.execute('SELECT * FROM users WHERE username = ?', (username,))
-        if c.fetchone():
+        if db.query_one('SELECT * FROM users WHERE username = ?', (username,)):
             print("Username already exists.")
             return
 
@@ -181,39 +315,92 @@ class User:
             confirm_password = input("Re-enter the password: ")
             if password == confirm_password:
                 password_hash = cls.hash_password(password)
-                c.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
-                conn.commit()
+                # Committed right away rather than with the next batch
+                with db.transaction():
+                    db.write('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
                 print("User registered successfully.")
                 break
             else:
                 print("Passwords do not match.")
 
+    # Log in and open a session; the future resolves to the session token, or None
+    @classmethod
+    def start_session(cls, username, password):
+        return hasher.submit(cls._start_session, username, password)
+
+    @classmethod
+    def _start_session(cls, username, password):
+        if not cls._login(username, password):
+            return None
+        return sessions.create(username)
+
+    # Username behind a session token, or None; no password hashing involved
+    @staticmethod
+    def from_session(token):
+        return sessions.validate(token) if token else None
+
     @classmethod
     def authenticate_user(cls):
         username = input("Enter your login: ")
-        c.execute('SELECT * FROM users WHERE username = ?', (username,))
-        user = c.fetchone()
+        user = db.query_one('SELECT * FROM users WHERE username = ?', (username,))
         if not user:
             print("Username does not exist.")
-            return False
+            return None
         password = input("Enter your password: ")
-        if cls.check_password(password, user[1]):
+        token = cls.start_session(username, password).result()
+        if token:
             print("Authentication successful.")
-            return username  # Return the username if authentication is successful
+            return token  # Return the session token if authentication is successful
         else:
             print("Incorrect password.")
-            return False
+            return None
 
 class Comment(Content):
     def __init__(self, author, post_id):
-        super().__init__(author)
+        super().__init__(author, "Write your comment: ")
         self.post_id = post_id
+        self.save_comment()
+        post = Post.cache.get(post_id)
+        if post is not None:
+            post.comment_count += 1
+
+    @classmethod
+    def from_row(cls, row):
+        comment = cls.__new__(cls)
+        comment.id, comment.post_id, comment.author, comment.text, comment.created_at = row
+        return comment
+
+    def save_comment(self):
+        cursor = db.write(INSERT_COMMENT, (self.post_id, self.author, self.text, self.created_at))
+        self.id = cursor.lastrowid
+
+    # Comments for a page of posts in one query instead of one per post: {post_id: [Comment]},
+    # oldest first, at most per_post (the newest ones) per post
+    @classmethod
+    def for_posts(cls, post_ids, per_post=20):
+        if not post_ids:
+            return {}
+        sql = COMMENTS_FOR_POSTS.format(columns=COMMENT_COLUMNS, placeholders=', '.join('?' * len(post_ids)))
+        comments = {}
+        for row in db.query(sql, (*post_ids, per_post)):
+            comment = cls.from_row(row)
+            comments.setdefault(comment.post_id, []).append(comment)
+        return comments
+
+    @classmethod
+    def add(cls, author):
+        post_id = int(input("Enter post id: "))
+        if db.query_one(POST_EXISTS, (post_id,)) is None:
+            print("Post not found.")
+            return
+        cls(author, post_id)
+        print("Comment added.")
 
     def __str__(self):
         return f"{self.author} commented on {self.post_id}: {self.text}"
 
 if __name__ == "__main__":
-    logged_in_user = None
+    session_token = None
 
     while True:
         print("Welcome to the new social")
@@ -225,11 +412,15 @@ if __name__ == "__main__":
             4. Dislike post
             5. Register user
             6. Login
+            7. Search posts
+            8. Logout
+            9. Comment on post
             0. Exit 
 
             Your Choice: """)
         choice = input(message)
         if choice == "1":
+            logged_in_user = User.from_session(session_token)
             if logged_in_user:
                 Post(logged_in_user)
             else:
@@ -243,10 +434,24 @@ if __name__ == "__main__":
         elif choice == "5":
             User.register_user()
         elif choice == "6":
-            logged_in_user = User.authenticate_user()
+            session_token = User.authenticate_user()
+        elif choice == "7":
+            Post.show_search()
+        elif choice == "8":
+            if session_token:
+                sessions.revoke(session_token)
+                session_token = None
+            print("Logged out.")
+        elif choice == "9":
+            logged_in_user = User.from_session(session_token)
+            if logged_in_user:
+                Comment.add(logged_in_user)
+            else:
+                print("You need to log in to comment.")
         elif choice == "0":
             break
         else:
             print("Wrong choice")
 
-conn.close()
+    votes.close()
+    db.close()
@@ -0,0 +1,89 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_TTL = 7 * 24 * 3600
+CACHE_SIZE = 10000
+PURGE_INTERVAL = 3600  # Expired sessions are deleted at most this often, on login
+
+
+# Only a hash of the token is stored, so a copy of the database cannot be used to log in
+def token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+# Login sessions: a random token per successful login, kept in the sessions table with an
+# expiry. Tokens that were already checked are kept in an in-process LRU, so authenticating
+# a request is a dict lookup; only the first use of a token in this process reads the table.
+# Expired rows are deleted by purge_expired(), which the app runs at startup and create()
+# runs at most every purge_interval seconds, so tokens nobody presents again do not pile up.
+class SessionStore:
+    def __init__(self, db, ttl=SESSION_TTL, cache_size=CACHE_SIZE, purge_interval=PURGE_INTERVAL):
+        self.db = db
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        self.purged_at = None
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def create(self, username):
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        if self.purged_at is None or now - self.purged_at >= self.purge_interval:
+            self.purge_expired()
+        key = token_key(token)
+        self.db.write(
+            'INSERT INTO sessions (token, username, created_at, expires_at) VALUES (?, ?, ?, ?)',
+            (key, username, now, now + self.ttl)
+        )
+        self._remember(key, username, now + self.ttl)
+        return token
+
+    # Username the token belongs to, or None if it is unknown, expired or revoked
+    def validate(self, token):
+        key = token_key(token)
+        now = time.time()
+        with self.lock:
+            session = self.cache.get(key)
+            if session is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if session is None:
+            row = self.db.query_one('SELECT username, expires_at FROM sessions WHERE token = ?', (key,))
+            if row is None:
+                return None
+            session = row
+            self._remember(key, *session)
+        username, expires_at = session
+        if expires_at <= now:
+            self.revoke(token)
+            return None
+        return username
+
+    def revoke(self, token):
+        key = token_key(token)
+        with self.lock:
+            self.cache.pop(key, None)
+        self.db.write('DELETE FROM sessions WHERE token = ?', (key,))
+
+    def purge_expired(self):
+        now = time.time()
+        self.purged_at = now
+        with self.lock:
+            for key in [key for key, (_, expires_at) in self.cache.items() if expires_at <= now]:
+                del self.cache[key]
+        return self.db.write('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+
+    def _remember(self, key, username, expires_at):
+        with self.lock:
+            self.cache[key] = (username, expires_at)
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
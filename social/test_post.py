@@ -0,0 +1,68 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+post = None
+directory = None
+
+
+# The post module opens SOCIAL_DB on import, so point it at a scratch database first
+def setUpModule():
+    global post, directory
+    if importlib.util.find_spec('bcrypt') is None:
+        raise unittest.SkipTest('bcrypt is not installed')
+    directory = tempfile.TemporaryDirectory()
+    os.environ['SOCIAL_DB'] = os.path.join(directory.name, 'test.db')
+    import post
+
+
+def tearDownModule():
+    if post is not None:
+        post.votes.close()
+        post.db.close()
+        directory.cleanup()
+
+
+class TestFeed(unittest.TestCase):
+
+    def setUp(self):
+        # Buffered votes stay in memory for the whole test
+        post.votes.flush()
+        post.votes.flush_interval = 60
+        with post.db.transaction():
+            post.db.write('DELETE FROM posts')
+            post.db.write_many(post.INSERT_POST, [
+                ('author', f'post {number}', datetime.now(), likes, 0, None)
+                for number, likes in enumerate((5, 4, 3, 2))
+            ])
+
+    def tearDown(self):
+        post.votes.flush()
+
+    def test_buffered_votes_do_not_move_the_cursor(self):
+        second = post.db.query_one('SELECT id FROM posts WHERE likes = 4')[0]
+        post.Post.vote(second, dislikes=3)
+
+        first_page, cursor = post.Post.feed(2)
+        second_page, _ = post.Post.feed(2, cursor)
+
+        self.assertEqual([p.text for p in first_page + second_page], ['post 0', 'post 1', 'post 2', 'post 3'])
+        self.assertEqual(cursor, (4, second))
+        # The numbers shown still include the buffered votes
+        self.assertEqual((first_page[1].likes, first_page[1].dislikes), (4, 3))
+
+    def test_vote_on_a_post_that_is_not_cached(self):
+        post_id = post.db.query_one('SELECT id FROM posts WHERE likes = 2')[0]
+        self.assertNotIn(post_id, post.Post.cache)
+        self.assertTrue(post.Post.vote(post_id, likes=1))
+        self.assertEqual(post.Post.counts(post_id), (3, 0))
+        self.assertFalse(post.Post.vote(-1, likes=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db import Database
+from migrations import migrate
+from sessions import SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.directory.name, 'test.db'))
+        migrate(self.db)
+        self.db.write('INSERT INTO users (username, password_hash) VALUES (?, ?)', ('alice', 'x'))
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def session_count(self):
+        self.db.flush()
+        return self.db.query_one('SELECT COUNT(*) FROM sessions')[0]
+
+    def test_login_purges_expired_sessions(self):
+        expired = SessionStore(self.db, ttl=-1)
+        for _ in range(3):
+            expired.create('alice')
+        self.assertEqual(self.session_count(), 3)
+
+        sessions = SessionStore(self.db)
+        token = sessions.create('alice')
+        self.assertEqual(self.session_count(), 1)
+        self.assertEqual(sessions.validate(token), 'alice')
+
+    def test_purge_runs_at_most_once_per_interval(self):
+        sessions = SessionStore(self.db, purge_interval=3600)
+        sessions.create('alice')
+        purged_at = sessions.purged_at
+        sessions.create('alice')
+        self.assertEqual(sessions.purged_at, purged_at)
+        self.assertLessEqual(purged_at, time.time())
+
+
+if __name__ == "__main__":
+    unittest.main()
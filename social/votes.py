@@ -0,0 +1,69 @@
+import atexit
+import threading
+
+FLUSH_VOTES = 'UPDATE posts SET likes = likes + ?, dislikes = dislikes + ? WHERE id = ?'
+
+
+# Write-behind buffer for votes. Likes and dislikes are summed per post in memory and written
+# as one UPDATE per post after flush_interval seconds or once max_pending votes are waiting,
+# so a viral post costs one row update per flush instead of one per click. Readers add
+# pending() to what they read from the table. Nothing is lost on a clean shutdown: close()
+# (or exit) flushes what is left.
+class VoteBuffer:
+    def __init__(self, db, flush_interval=0.5, max_pending=10000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.deltas = {}
+        self.votes = 0
+        self.flushes = 0
+        self.lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def add(self, post_id, likes=0, dislikes=0):
+        with self.lock:
+            delta = self.deltas.setdefault(post_id, [0, 0])
+            delta[0] += likes
+            delta[1] += dislikes
+            self.votes += 1
+            if self.votes >= self.max_pending:
+                flush_now = True
+            else:
+                flush_now = False
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def pending(self, post_id):
+        with self.lock:
+            delta = self.deltas.get(post_id)
+            return (delta[0], delta[1]) if delta is not None else (0, 0)
+
+    # Counts read from the table plus the votes not written yet
+    def merged(self, post_id, counts):
+        likes, dislikes = self.pending(post_id)
+        return counts[0] + likes, counts[1] + dislikes
+
+    # Readers hold the database lock while reading counts and adding pending(), and so does
+    # flush(), so a vote is always either in the table or in the buffer for them
+    def flush(self):
+        with self.db.lock:
+            with self.lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                deltas, self.deltas = self.deltas, {}
+                self.votes = 0
+            if not deltas:
+                return
+            rows = [(likes, dislikes, post_id) for post_id, (likes, dislikes) in deltas.items()]
+            with self.db.transaction():
+                self.db.write_many(FLUSH_VOTES, rows)
+            self.flushes += 1
+
+    def close(self):
+        self.flush()
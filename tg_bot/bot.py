@@ -1,11 +1,21 @@
 import asyncio
+import os
+import sys
+from functools import partial
 import aiosqlite
 from aiogram import Bot, Dispatcher, F, types
 from aiogram.filters.command import Command
 from aiogram.enums import ParseMode
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tg_common.fake_telegram import run_benchmark
+from tg_common.sender import SendScheduler
+from tg_common.webhook import build_webhook_app, parse_args, run_webhook, worker_send_rate
+
 bot = Bot(token="token")
 dispatcher = Dispatcher()
+# All outgoing messages go through one rate-limited queue
+sender = SendScheduler(bot)
 
 
 # Database initialization
@@ -24,13 +34,13 @@ async def init_db():
 # Command to start the conversation
 @dispatcher.message(Command("start"))
 async def handle_message(message: types.Message):
-    await message.answer("Conversation started")
+    sender.answer(message, "Conversation started")
 
 
 # Command to add a new to-do item
 @dispatcher.message(Command("add"))
 async def add_todo_command(message: types.Message):
-    await message.answer("Please send the description and priority (1-10) in the format: description,priority")
+    sender.answer(message, "Please send the description and priority (1-10) in the format: description,priority")
 
 
 # Handler to process the to-do item input
@@ -43,9 +53,9 @@ async def add_todo_handler(message: types.Message):
         async with aiosqlite.connect('todo.db') as db:
             await db.execute('INSERT INTO todos (description, priority) VALUES (?, ?)', (description, priority))
             await db.commit()
-        await message.answer(f'To-do item added: {description} with priority {priority}')
+        sender.answer(message, f'To-do item added: {description} with priority {priority}')
     else:
-        await message.answer('Priority must be an integer between 1 and 10')
+        sender.answer(message, 'Priority must be an integer between 1 and 10')
 
 
 # Command to list all to-do items
@@ -61,13 +71,13 @@ async def list_todos(message: types.Message):
     else:
         response = "No to-do items found."
 
-    await message.answer(response)
+    sender.answer(message, response)
 
 
 # Command to delete a to-do item by its ID
 @dispatcher.message(Command("delete"))
 async def delete_todo_command(message: types.Message):
-    await message.answer("Please send the ID of the to-do item to delete")
+    sender.answer(message, "Please send the ID of the to-do item to delete")
 
 
 @dispatcher.message(F.text.regexp(r'^\d+$'))
@@ -78,15 +88,16 @@ async def delete_todo_handler(message: types.Message):
         cursor = await db.execute('DELETE FROM todos WHERE id = ?', (todo_id,))
         await db.commit()
         if cursor.rowcount == 0:
-            await message.answer(f'No to-do item with ID {todo_id} found.')
+            sender.answer(message, f'No to-do item with ID {todo_id} found.')
         else:
-            await message.answer(f'To-do item with ID {todo_id} deleted.')
+            sender.answer(message, f'To-do item with ID {todo_id} deleted.')
 
 
 # Handlers for specific text messages
 @dispatcher.message(F.text == "HELLO!!!")
 async def handle_expressive(message: types.Message):
-    await message.answer(
+    sender.answer(
+        message,
         f"Hello, <i>{message.from_user.first_name}!</i>",
         parse_mode=ParseMode.HTML
     )
@@ -94,18 +105,45 @@ async def handle_expressive(message: types.Message):
 
 @dispatcher.message(F.text == "hello")
 async def handle_unknow(message: types.Message):
-    await message.answer("Hello!")
+    sender.answer(message, "Hello!")
 
 
 @dispatcher.message(F.text)
 async def handle_unknow(message: types.Message):
-    await message.answer("Didn't get you")
+    sender.answer(message, "Didn't get you")
 
 
-async def main():
+async def on_startup():
     await init_db()
+    sender.start()
+
+
+async def on_shutdown():
+    await sender.stop()
+
+
+dispatcher.startup.register(on_startup)
+dispatcher.shutdown.register(on_shutdown)
+
+
+def make_webhook_app(secret_token=None, send_rate=None):
+    # With several worker processes each one gets a share of the global send limit
+    if send_rate is not None:
+        sender.set_global_rate(send_rate)
+    return build_webhook_app(dispatcher, bot, secret_token, health=sender.stats)
+
+
+async def main():
     await dispatcher.start_polling(bot)
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    args = parse_args("To-do bot")
+    if args.mode == 'webhook':
+        run_webhook(partial(make_webhook_app, args.secret, worker_send_rate(args.workers)), bot, args)
+    elif args.mode == 'benchmark':
+        if args.send_rate:
+            sender.set_global_rate(args.send_rate)
+        asyncio.run(run_benchmark(make_webhook_app, bot, args.updates, args.concurrency))
+    else:
+        asyncio.run(main())
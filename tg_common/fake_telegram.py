@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import statistics
+import time
+from aiohttp import ClientSession, web
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from tg_common.webhook import WEBHOOK_PATH
+
+
+# Local stand-in for the Bot API: answers the methods the bots use and records when a reply
+# reaches each chat, so update-to-reply latency can be measured without the network
+class FakeTelegram:
+    def __init__(self):
+        self.message_ids = itertools.count(1)
+        self.calls = 0
+        self._waiters = {}
+
+    def expect_reply(self, chat_id):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = future
+        return future
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        data = await request.post()
+        self.calls += 1
+
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(data['chat_id'])
+            waiter = self._waiters.pop(chat_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(time.perf_counter())
+            result = {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': data.get('text', ''),
+            }
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+
+def make_update(update_id, chat_id, text):
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Bench'},
+            'from': user,
+            'text': text,
+        },
+    }
+
+
+async def start_site(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+# Post `updates` messages to the bot's webhook app, each from its own chat, and time how long
+# it takes for the reply to arrive at the fake Bot API
+async def run_benchmark(make_app, bot, updates=500, concurrency=50, text='/start'):
+    fake = FakeTelegram()
+    fake_runner, fake_url = await start_site(fake.app())
+    bot.session = AiohttpSession(api=TelegramAPIServer.from_base(fake_url))
+    bot_runner, bot_url = await start_site(make_app())
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_update(http, update_id):
+        chat_id = 100000 + update_id
+        async with semaphore:
+            reply = fake.expect_reply(chat_id)
+            started = time.perf_counter()
+            async with http.post(bot_url + WEBHOOK_PATH, json=make_update(update_id, chat_id, text)) as response:
+                response.raise_for_status()
+            try:
+                replied = await asyncio.wait_for(reply, timeout=30)
+            except asyncio.TimeoutError:
+                print(f"No reply for update {update_id}")
+                return
+            latencies.append(replied - started)
+
+    try:
+        started = time.perf_counter()
+        async with ClientSession() as http:
+            await asyncio.gather(*(one_update(http, update_id) for update_id in range(1, updates + 1)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await bot_runner.cleanup()
+        await fake_runner.cleanup()
+        await bot.session.close()
+
+    if not latencies:
+        print("No replies received.")
+        return None
+    result = {
+        'updates': updates,
+        'replied': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+        'api_calls': fake.calls,
+    }
+    print(f"Benchmark: {result}")
+    return result
@@ -0,0 +1,230 @@
+import asyncio
+import time
+from collections import deque
+from aiogram.exceptions import TelegramRetryAfter
+
+MAX_MESSAGE_LENGTH = 4096
+GLOBAL_RATE = 30  # Telegram: about 30 messages per second across all chats
+CHAT_RATE = 1.0  # About one message per second in a private chat
+GROUP_RATE = 20 / 60  # 20 messages per minute in a group
+PRUNE_INTERVAL = 60.0  # Seconds between sweeps for chat buckets that are no longer needed
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until a token is available
+    def delay(self, now):
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    # Full and not paused: a new bucket would behave exactly the same
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class OutgoingMessage:
+    def __init__(self, chat_id, text, parse_mode, reply_markup):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.reply_markup = reply_markup
+        self.queued_at = time.monotonic()
+        self.futures = [asyncio.get_running_loop().create_future()]
+
+
+def log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Failed to send message: {future.exception()}")
+
+
+# Shared outbound queue for bot messages. Sends are paced by a global token bucket and one
+# bucket per chat, consecutive messages to the same chat are merged into one when they fit,
+# and a 429 pauses only the chat it came from. send() returns a future, so a handler can
+# queue several messages without waiting for each of them to go out. All limits are per process:
+# several webhook workers split the global rate between them (see webhook.worker_send_rate).
+class SendScheduler:
+    def __init__(self, bot, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, group_rate=GROUP_RATE,
+                 chat_burst=3, max_in_flight=30):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_in_flight = max_in_flight
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets = {}
+        self.queues = {}
+        # Chats with a message on the way; one at a time per chat keeps their order
+        self.busy_chats = set()
+        self.in_flight = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.max_wait = 0.0
+        self._wakeup = asyncio.Event()
+        self._deliveries = set()
+        self._task = None
+        self._running = False
+        self._pruned_at = time.monotonic()
+
+    def start(self):
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10.0):
+        # Give queued messages a chance to go out before shutting down
+        deadline = time.monotonic() + timeout
+        while (self.queues or self.in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        self._running = False
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        print(f"Send queue stopped: {self.stats()}")
+
+    def set_global_rate(self, rate):
+        self.global_bucket = TokenBucket(rate, rate)
+
+    def send(self, chat_id, text, parse_mode=None, reply_markup=None):
+        message = OutgoingMessage(chat_id, text, parse_mode, reply_markup)
+        message.futures[0].add_done_callback(log_failure)
+        self.queues.setdefault(chat_id, deque()).append(message)
+        self._wakeup.set()
+        return message.futures[0]
+
+    def answer(self, message, text, parse_mode=None, reply_markup=None):
+        return self.send(message.chat.id, text, parse_mode, reply_markup)
+
+    # Backpressure metrics
+    def stats(self):
+        now = time.monotonic()
+        oldest = min((queue[0].queued_at for queue in self.queues.values()), default=now)
+        return {
+            'queued': sum(len(queue) for queue in self.queues.values()),
+            'chats_waiting': len(self.queues),
+            'in_flight': self.in_flight,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'oldest_wait': round(now - oldest, 3),
+            'max_wait': round(self.max_wait, 3),
+        }
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    # Forget the buckets of chats with nothing queued or on the way once they have refilled,
+    # so a long-running bot keeps buckets only for chats it is talking to right now
+    def _prune_buckets(self, now):
+        self._pruned_at = now
+        for chat_id in [
+            chat_id for chat_id, bucket in self.chat_buckets.items()
+            if chat_id not in self.queues and chat_id not in self.busy_chats and bucket.idle(now)
+        ]:
+            del self.chat_buckets[chat_id]
+
+    # Merge the head of a chat's queue with the messages behind it while they fit in one message.
+    # Messages with a keyboard are sent on their own: their buttons may edit the message in
+    # place, which would overwrite any text merged into it.
+    def _take(self, chat_id):
+        queue = self.queues[chat_id]
+        message = queue.popleft()
+        while queue and message.reply_markup is None:
+            following = queue[0]
+            if following.reply_markup is not None or following.parse_mode != message.parse_mode:
+                break
+            text = f"{message.text}\n\n{following.text}"
+            if len(text) > MAX_MESSAGE_LENGTH:
+                break
+            queue.popleft()
+            message.text = text
+            message.futures.extend(following.futures)
+            message.queued_at = min(message.queued_at, following.queued_at)
+            self.coalesced += 1
+        if not queue:
+            del self.queues[chat_id]
+        return message
+
+    async def _run(self):
+        while self._running:
+            self._wakeup.clear()
+            next_delay = None
+            now = time.monotonic()
+            if now - self._pruned_at >= PRUNE_INTERVAL:
+                self._prune_buckets(now)
+
+            for chat_id in list(self.queues):
+                if self.in_flight >= self.max_in_flight:
+                    break
+                if chat_id in self.busy_chats:
+                    continue
+                global_delay = self.global_bucket.delay(now)
+                if global_delay > 0:
+                    next_delay = global_delay
+                    break
+                bucket = self._chat_bucket(chat_id)
+                delay = bucket.delay(now)
+                if delay > 0:
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+                    continue
+                bucket.take(now)
+                self.global_bucket.take(now)
+                message = self._take(chat_id)
+                self.in_flight += 1
+                self.busy_chats.add(chat_id)
+                delivery = asyncio.create_task(self._deliver(message))
+                self._deliveries.add(delivery)
+                delivery.add_done_callback(self._deliveries.discard)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, message):
+        try:
+            result = await self.bot.send_message(
+                message.chat_id, message.text, parse_mode=message.parse_mode, reply_markup=message.reply_markup
+            )
+        except TelegramRetryAfter as e:
+            # Flood limit hit: pause this chat and put the message back at the front
+            self.retries += 1
+            self._chat_bucket(message.chat_id).block(time.monotonic(), e.retry_after)
+            self.queues.setdefault(message.chat_id, deque()).appendleft(message)
+        except Exception as e:
+            for future in message.futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self.sent += 1
+            self.max_wait = max(self.max_wait, time.monotonic() - message.queued_at)
+            for future in message.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.in_flight -= 1
+            self.busy_chats.discard(message.chat_id)
+            self._wakeup.set()
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from tg_common.sender import GLOBAL_RATE
+
+WEBHOOK_PATH = '/webhook'
+HEALTH_PATH = '/health'
+
+
+def parse_args(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('mode', nargs='?', default='polling', choices=('polling', 'webhook', 'benchmark'))
+    parser.add_argument('--url', default=os.environ.get('WEBHOOK_URL'),
+                        help='public base URL Telegram should post updates to')
+    parser.add_argument('--secret', default=os.environ.get('WEBHOOK_SECRET'))
+    parser.add_argument('--host', default=os.environ.get('WEBHOOK_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('WEBHOOK_PORT', 8080)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEBHOOK_WORKERS', 1)))
+    parser.add_argument('--updates', type=int, default=500, help='benchmark: number of updates to send')
+    parser.add_argument('--concurrency', type=int, default=50, help='benchmark: updates in flight')
+    parser.add_argument('--send-rate', type=float, default=None,
+                        help='benchmark: global sends per second instead of Telegram\'s limit')
+    return parser.parse_args()
+
+
+# aiohttp app serving updates for the dispatcher on WEBHOOK_PATH and a health check on HEALTH_PATH.
+# The dispatcher's startup/shutdown hooks run with the app, so the bot's resources are opened
+# and flushed the same way as in polling mode.
+def build_webhook_app(dispatcher, bot, secret_token=None, health=None):
+    started_at = time.monotonic()
+
+    async def health_check(request):
+        info = {'status': 'ok', 'pid': os.getpid(), 'uptime': round(time.monotonic() - started_at, 1)}
+        if health is not None:
+            info.update(health())
+        return web.json_response(info)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    app.router.add_get(HEALTH_PATH, health_check)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+def serve(make_app, host, port, reuse_port=False):
+    # run_app stops on SIGINT/SIGTERM and waits for in-flight requests before the shutdown hooks
+    web.run_app(make_app(), host=host, port=port, reuse_port=reuse_port, shutdown_timeout=10.0, print=None)
+
+
+async def register_webhook(bot, url, secret_token=None):
+    try:
+        await bot.set_webhook(url, secret_token=secret_token, drop_pending_updates=False)
+        print(f"Webhook set to {url}")
+    finally:
+        await bot.session.close()
+
+
+# Share of Telegram's global send limit each worker process may use. Only the global limit is
+# split: per-chat limits are enforced per process, so two workers answering the same chat at
+# once can exceed that chat's limit and rely on the retry after a 429.
+def worker_send_rate(workers):
+    return GLOBAL_RATE / max(workers, 1)
+
+
+# Register the webhook once, then serve it from one process per worker sharing the port
+# (SO_REUSEPORT), so several replicas can also run behind a load balancer. make_app is
+# expected to give its SendScheduler worker_send_rate(args.workers).
+def run_webhook(make_app, bot, args):
+    if not args.url:
+        raise SystemExit("Webhook mode needs --url or WEBHOOK_URL")
+    asyncio.run(register_webhook(bot, args.url.rstrip('/') + WEBHOOK_PATH, args.secret))
+
+    if args.workers <= 1:
+        serve(make_app, args.host, args.port)
+        return
+
+    processes = [
+        multiprocessing.Process(target=serve, args=(make_app, args.host, args.port, True), daemon=False)
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Serving webhook on {args.host}:{args.port} with {args.workers} workers")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()